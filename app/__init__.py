@@ -3,24 +3,27 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_mail import Mail
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
-from flask_migrate import Migrate
+from flask_wtf.csrf import CSRFProtect
 from config import Config
 
 db = SQLAlchemy()
 mail = Mail()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
-migrate = Migrate()
+csrf = CSRFProtect()
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
 
-    db.init_app(app)
+    from app.database import init_database
+
+    init_database(app)
     mail.init_app(app)
     login_manager.init_app(app)
     bcrypt.init_app(app)
-    migrate.init_app(app, db)
+    # Todo POST necesita el token CSRF de la sesión, también los formularios que no son FlaskForm
+    csrf.init_app(app)
     app.static_folder = '../static'
     app.template_folder = '../templates'
 
@@ -31,16 +34,34 @@ def create_app():
     from app.routes.auth import auth_bp
     from app.routes.raffle import raffle_bp
     from app.routes.number import number_bp
+    from app.routes.metrics import metrics_bp
     from app.models import User
+    from app.rates import init_rates
+    from app.instrumentation import init_instrumentation
+    from app.commands import init_commands
+    from app.cache import init_cache
+    from app.events import init_events
+    from app.images import init_images
+    from app.assets import init_assets
+    from app.limits import init_limits
+    from app.metrics import init_metrics
 
+    init_rates(app)
+    init_images(app)
+    init_assets(app)
+    init_cache(app)
+    init_events(app)
+    init_metrics(app)
+    init_limits(app)
+    init_instrumentation(app)
+    init_commands(app)
     app.register_blueprint(auth_bp)
     app.register_blueprint(raffle_bp)
     app.register_blueprint(number_bp)
+    app.register_blueprint(metrics_bp)
 
     @login_manager.user_loader
     def load_user(user_id):
         return User.query.get(int(user_id))
 
     return app
-
-app = create_app()
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""Motor de asignación de números de las rifas.
+
+Cada sorteo mantiene un pool persistente de números libres organizado como un
+Fisher-Yates perezoso: las posiciones ``0 .. available_count - 1`` contienen los
+números libres y una posición sin fila en ``NumberPoolSlot`` vale ``slot + 1``.
+Sacar N números cuesta O(N) sin importar el tamaño del sorteo y la selección es
+uniforme, igual que ``random.sample``. Cuántos quedan libres es
+``available_count``, sin contar filas de ``RaffleNumber``.
+"""
+import random
+
+from sqlalchemy import delete, insert, select
+
+from app import db
+from app.models import Draw, NumberPoolSlot, RaffleNumber
+
+# Tamaño de lote para no exceder el límite de parámetros de SQLite
+CHUNK_SIZE = 500
+
+_rng = random.SystemRandom()
+
+
+class NotEnoughNumbers(Exception):
+    def __init__(self, available):
+        super().__init__(f'Solo quedan {available} números disponibles.')
+        self.available = available
+
+
+class SoldNumbersLocked(ValueError):
+    def __init__(self):
+        super().__init__('Los números vendidos de este sorteo quedaron fijados al publicar el commit de ganadores.')
+
+
+def ensure_unlocked(raffle):
+    # Con el commit de ganadores publicado los vendidos ya no cambian (ver app.draws). El commit exige
+    # el sorteo inactivo y no deja reactivarlo, así las compras de un sorteo activo no hacen esta consulta
+    if not raffle.active and db.session.scalar(select(Draw.id).where(Draw.raffle_id == raffle.id)) is not None:
+        raise SoldNumbersLocked()
+
+
+def chunked(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i:i + CHUNK_SIZE]
+
+
+def _load_slots(raffle_id, slots):
+    values = {slot: slot + 1 for slot in slots}
+    for chunk in chunked(slots):
+        rows = db.session.execute(
+            select(NumberPoolSlot.slot, NumberPoolSlot.number)
+            .where(NumberPoolSlot.raffle_id == raffle_id, NumberPoolSlot.slot.in_(chunk))
+        )
+        values.update(rows.all())
+    return values
+
+
+def _store_slots(raffle_id, values, size):
+    for chunk in chunked(values):
+        db.session.execute(
+            delete(NumberPoolSlot)
+            .where(NumberPoolSlot.raffle_id == raffle_id, NumberPoolSlot.slot.in_(chunk))
+        )
+    rows = [{'raffle_id': raffle_id, 'slot': slot, 'number': number}
+            for slot, number in values.items() if slot < size and number != slot + 1]
+    if rows:
+        db.session.execute(insert(NumberPoolSlot), rows)
+
+
+def _sold_from_rows(raffle):
+    return set(db.session.scalars(select(RaffleNumber.number).where(RaffleNumber.raffle_id == raffle.id)))
+
+
+def rebuild_pool(raffle):
+    # Reconstruye el pool a partir de los números vendidos: O(max_number), solo para
+    # sorteos existentes o cuando se reduce el máximo
+    db.session.execute(delete(NumberPoolSlot).where(NumberPoolSlot.raffle_id == raffle.id))
+    used = _sold_from_rows(raffle)
+    rows = []
+    slot = 0
+    for number in range(1, raffle.max_number + 1):
+        if number in used:
+            continue
+        if number != slot + 1:
+            rows.append({'raffle_id': raffle.id, 'slot': slot, 'number': number})
+        slot += 1
+    for chunk in chunked(rows):
+        db.session.execute(insert(NumberPoolSlot), chunk)
+    raffle.available_count = slot
+
+
+def ensure_pool(raffle):
+    if raffle.available_count is None:
+        rebuild_pool(raffle)
+
+
+def draw_numbers(raffle, count):
+    ensure_unlocked(raffle)
+    ensure_pool(raffle)
+    size = raffle.available_count
+    if count > size:
+        raise NotEnoughNumbers(size)
+
+    # Los índices no dependen de los valores, así que se leen todas las posiciones en una pasada
+    picks = [_rng.randrange(size - k) for k in range(count)]
+    values = _load_slots(raffle.id, set(picks) | set(range(size - count, size)))
+
+    drawn = []
+    for k, slot in enumerate(picks):
+        last = size - k - 1
+        drawn.append(values[slot])
+        values[slot] = values[last]
+
+    _store_slots(raffle.id, values, size - count)
+    raffle.available_count = size - count
+    return drawn
+
+
+def release_numbers(raffle, numbers):
+    # Devuelve al pool números vendidos (por ejemplo al eliminar una persona o un número)
+    ensure_unlocked(raffle)
+    if raffle.available_count is None:
+        return
+    size = raffle.available_count
+    values = {}
+    for number in numbers:
+        number = int(number)
+        if 1 <= number <= raffle.max_number:
+            values[size] = number
+            size += 1
+    if values:
+        _store_slots(raffle.id, values, size)
+    raffle.available_count = size
+
+
+def resize_pool(raffle, old_max_number):
+    if raffle.available_count is None or raffle.max_number == old_max_number:
+        return
+    if raffle.max_number > old_max_number:
+        release_numbers(raffle, range(old_max_number + 1, raffle.max_number + 1))
+    else:
+        rebuild_pool(raffle)
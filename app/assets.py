@@ -0,0 +1,135 @@
+"""Archivos estáticos con huella digital y caché de larga duración.
+
+``url_for('static', filename='css/style_base.css')`` genera
+``/static/css/style_base.<hash>.css``. Como el nombre cambia cuando cambia el
+contenido, esas respuestas se marcan ``immutable`` por un año. Si existen
+versiones precomprimidas (``.br`` / ``.gz``, generadas con
+``flask compress-static``) y no son más viejas que el original, se sirven
+según ``Accept-Encoding``. Las peticiones
+condicionales y por rangos las resuelve ``send_from_directory``.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_from_directory
+
+FINGERPRINT_LENGTH = 12
+FINGERPRINT_RE = re.compile(r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % FINGERPRINT_LENGTH)
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.html', '.json', '.txt'}
+# Imágenes generadas por app.images: el nombre ya incluye el hash del contenido
+HASHED_MEDIA_RE = re.compile(r'^[0-9a-f]{16}-[a-z]+\.(jpg|webp)$')
+
+_fingerprints = {}  # filename -> (mtime, huella)
+
+
+def fingerprint(filename):
+    cached = _fingerprints.get(filename)
+    if cached is not None and not current_app.debug:
+        return cached[1]
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as static_file:
+        value = hashlib.sha256(static_file.read()).hexdigest()[:FINGERPRINT_LENGTH]
+    _fingerprints[filename] = (mtime, value)
+    return value
+
+
+def _add_fingerprint(endpoint, values):
+    if endpoint != 'static' or 'filename' not in values:
+        return
+    filename = values['filename']
+    stem, ext = os.path.splitext(filename)
+    value = fingerprint(filename) if ext else None
+    if value:
+        values['filename'] = f'{stem}.{value}{ext}'
+
+
+def _precompressed(directory, filename):
+    # Solo si la versión comprimida es al menos tan nueva como el original: si se editó el archivo y no
+    # se volvió a correr compress-static, se sirve el original y no bytes viejos bajo la huella nueva
+    if os.path.splitext(filename)[1] not in COMPRESSIBLE_EXTENSIONS:
+        return None, filename
+    path = os.path.join(directory, filename)
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None, filename
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding not in request.accept_encodings:
+            continue
+        try:
+            if os.stat(path + suffix).st_mtime_ns >= source_mtime:
+                return encoding, filename + suffix
+        except OSError:
+            pass
+    return None, filename
+
+
+def send_cached(directory, filename, max_age, immutable=False):
+    encoding, path = _precompressed(directory, filename)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(directory, path, mimetype=mimetype, max_age=max_age, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if os.path.splitext(filename)[1] in COMPRESSIBLE_EXTENSIONS:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+def serve_static(filename):
+    match = FINGERPRINT_RE.match(filename)
+    if match:
+        original = match['stem'] + match['ext']
+        if os.path.isfile(os.path.join(current_app.static_folder, original)):
+            # Una huella vieja se sirve con el contenido actual, pero sin caché larga
+            current = match['fingerprint'] == fingerprint(original)
+            max_age = current_app.config['STATIC_MAX_AGE'] if current else 0
+            return send_cached(current_app.static_folder, original, max_age, immutable=current)
+    return send_cached(current_app.static_folder, filename, 0)
+
+
+def media_max_age(filename):
+    if HASHED_MEDIA_RE.match(filename):
+        return current_app.config['STATIC_MAX_AGE'], True
+    return current_app.config['MEDIA_LEGACY_MAX_AGE'], False
+
+
+def compress_static(folder):
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    written = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as source:
+                data = source.read()
+            variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(data, quality=11)))
+            for suffix, compressed in variants:
+                if len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as target:
+                        target.write(compressed)
+                    written.append(path + suffix)
+    return written
+
+
+def init_assets(app):
+    app.url_defaults(_add_fingerprint)
+    app.view_functions['static'] = serve_static
@@ -0,0 +1,126 @@
+"""Caché de los sorteos activos para las páginas públicas.
+
+Cada worker guarda en memoria una copia de todos los sorteos activos,
+indexados por slug, y de los números que le quedan a cada uno. Los sorteos
+activos se cargan juntos con una sola consulta, así cada petición cuesta un
+``os.stat`` y una búsqueda en un dict sin importar cuántos sorteos haya. Para invalidar entre workers se usa un archivo "stamp" en la
+carpeta ``instance``: al cambiar un sorteo se reemplaza el archivo y cada
+worker compara su inodo y fecha de modificación con un ``os.stat`` (sin
+consultar la base de datos). La cantidad de números restantes tiene un TTL corto y se
+invalida localmente en cada compra.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+from app import db
+from app.models import Raffle
+
+RaffleSnapshot = namedtuple('RaffleSnapshot', 'id name slug image_filename image_hash valor_numero max_number')
+
+# Los tokens CSRF de flask-wtf duran una hora; una página cacheada nunca debe superar ese tiempo
+CSRF_BUCKET_SECONDS = 1800
+
+
+class ActiveRaffleCache:
+    def __init__(self, stamp_path, ttl, count_ttl):
+        self.stamp_path = stamp_path
+        self.ttl = ttl
+        self.count_ttl = count_ttl
+        self._lock = threading.Lock()
+        self._raffles = None  # (stamp, cargado_en, {slug: snapshot})
+        self._remaining = {}  # raffle_id -> (cargado_en, cantidad)
+
+    def stamp(self):
+        # Cada invalidación reemplaza el archivo: el inodo cambia aunque el sistema de
+        # archivos tenga poca resolución en las fechas de modificación
+        try:
+            stat = os.stat(self.stamp_path)
+        except FileNotFoundError:
+            return '0'
+        return f'{stat.st_ino}-{stat.st_mtime_ns}'
+
+    def last_modified(self):
+        try:
+            return datetime.fromtimestamp(os.stat(self.stamp_path).st_mtime, timezone.utc)
+        except FileNotFoundError:
+            return None
+
+    def invalidate(self):
+        # El temporal se crea mientras existe el stamp anterior, así nunca comparten inodo
+        tmp_path = f'{self.stamp_path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as stamp_file:
+            stamp_file.write(str(time.time_ns()))
+        os.replace(tmp_path, self.stamp_path)
+        with self._lock:
+            self._raffles = None
+            self._remaining.clear()
+
+    def invalidate_remaining(self, raffle_id):
+        with self._lock:
+            self._remaining.pop(raffle_id, None)
+
+    def active_raffles(self):
+        # Todos los sorteos activos por slug, en orden de creación; el dict se reemplaza entero, nunca se modifica
+        stamp = self.stamp()
+        cached = self._raffles
+        if cached is not None and cached[0] == stamp and time.monotonic() - cached[1] < self.ttl:
+            return cached[2]
+
+        rows = db.session.execute(
+            db.select(*(getattr(Raffle, field) for field in RaffleSnapshot._fields))
+            .filter_by(active=True).order_by(Raffle.id)
+        )
+        raffles = {row.slug: RaffleSnapshot(*row) for row in rows}
+        with self._lock:
+            self._raffles = (stamp, time.monotonic(), raffles)
+        return raffles
+
+    def active_raffle(self, slug):
+        return self.active_raffles().get(slug)
+
+    def remaining(self, raffle_id):
+        cached = self._remaining.get(raffle_id)
+        if cached is not None and time.monotonic() - cached[0] < self.count_ttl:
+            return cached[1]
+        count = db.session.scalar(db.select(Raffle.available_count).where(Raffle.id == raffle_id))
+        with self._lock:
+            self._remaining[raffle_id] = (time.monotonic(), count)
+        return count
+
+
+def init_cache(app):
+    os.makedirs(app.instance_path, exist_ok=True)
+    app.extensions['raffle_cache'] = ActiveRaffleCache(
+        os.path.join(app.instance_path, 'raffle_cache.stamp'),
+        ttl=app.config['ACTIVE_RAFFLE_CACHE_TTL'],
+        count_ttl=app.config['RAFFLE_COUNT_CACHE_TTL'],
+    )
+
+
+def raffle_cache():
+    return current_app.extensions['raffle_cache']
+
+
+def page_etag(raffle):
+    # La página depende del sorteo, del usuario y del token CSRF de la sesión
+    cache = raffle_cache()
+    parts = [
+        cache.stamp(),
+        raffle.id if raffle else 0,
+        current_user.get_id() or '',
+        session.get('csrf_token', ''),
+        int(time.time() // CSRF_BUCKET_SECONDS),
+    ]
+    return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def is_cacheable_request():
+    # Los mensajes flash se muestran una sola vez, así que esa respuesta no se puede reutilizar
+    return request.method == 'GET' and '_flashes' not in session and 'csrf_token' in session
@@ -0,0 +1,90 @@
+import click
+from flask import Flask
+
+# Filas por lote al copiar datos entre bases
+COPY_BATCH_SIZE = 1000
+
+
+class MigrateGroup(click.Group):
+    # `flask db ...` de Flask-Migrate. Importar Flask-Migrate carga alembic (~150 ms y varios MB),
+    # así que se registra recién cuando se usa uno de estos comandos y nunca en los workers web
+    def __init__(self, app: Flask):
+        super().__init__('db', help='Migraciones de la base de datos (Flask-Migrate).')
+        self.app = app
+
+    def _commands(self):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_commands
+        from app import db
+        if 'migrate' not in self.app.extensions:
+            Migrate(self.app, db, render_as_batch=True)
+        return db_commands
+
+    def list_commands(self, ctx):
+        return self._commands().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._commands().get_command(ctx, name)
+
+
+def init_commands(app: Flask):
+    app.cli.add_command(MigrateGroup(app))
+
+    @app.cli.command('send-emails')
+    @click.option('--once', is_flag=True, help='Procesar un solo lote y salir.')
+    @click.option('--interval', default=5, show_default=True, help='Segundos de espera cuando la cola está vacía.')
+    def send_emails(once, interval):
+        """Entrega los correos pendientes de la cola."""
+        from app.mailer import run_worker
+        run_worker(interval, once=once)
+
+    @app.cli.command('compress-static')
+    def compress_static_command():
+        """Genera las versiones .gz (y .br si está instalado brotli) de los estáticos."""
+        from app.assets import compress_static
+        for path in compress_static(app.static_folder):
+            click.echo(path)
+
+    @app.cli.command('purge-unconfirmed')
+    @click.option('--hours', type=int, help='Antigüedad mínima en horas (por defecto UNCONFIRMED_PURGE_HOURS).')
+    @click.option('--raffle-id', type=int, help='Solo personas de este sorteo.')
+    def purge_unconfirmed_command(hours, raffle_id):
+        """Elimina las personas sin confirmar y devuelve sus números al pool."""
+        from app import db
+        from app.cache import raffle_cache
+        from app.retention import purge_unconfirmed
+        deleted, raffle_ids = purge_unconfirmed(hours or app.config['UNCONFIRMED_PURGE_HOURS'], raffle_id)
+        db.session.commit()
+        if raffle_ids:
+            raffle_cache().invalidate()
+        click.echo(f'{deleted} personas eliminadas')
+
+    @app.cli.command('copy-data')
+    @click.argument('source_url')
+    def copy_data(source_url):
+        """Copia todos los datos de SOURCE_URL a la base configurada.
+
+        Pensado para migrar de SQLite a Postgres: primero `flask db upgrade`
+        contra la base nueva (DATABASE_URL) y luego
+        `flask copy-data sqlite:///ruta/rifa.db`.
+        """
+        from sqlalchemy import create_engine, func, select, text
+        from app import db
+
+        source = create_engine(source_url)
+        target = db.engine
+        with source.connect() as src, target.begin() as dst:
+            for table in db.metadata.sorted_tables:
+                copied = 0
+                result = src.execution_options(yield_per=COPY_BATCH_SIZE).execute(select(table))
+                for rows in result.mappings().partitions():
+                    dst.execute(table.insert(), [dict(row) for row in rows])
+                    copied += len(rows)
+                click.echo(f'{table.name}: {copied} filas')
+
+                # Postgres no avanza las secuencias cuando se insertan ids explícitos
+                id_column = table.c.get('id')
+                if target.dialect.name == 'postgresql' and id_column is not None and copied:
+                    max_id = dst.scalar(select(func.max(id_column)))
+                    dst.execute(text('SELECT setval(pg_get_serial_sequence(:table, :column), :value)'),
+                                {'table': f'"{table.name}"', 'column': 'id', 'value': max_id})
@@ -0,0 +1,50 @@
+"""Configuración del motor de base de datos.
+
+Con Postgres (u otro servidor) se usa un pool de conexiones configurable.
+Con SQLite cada conexión se abre en modo WAL con ``busy_timeout``, así los
+lectores no bloquean a quien escribe y los workers esperan el bloqueo en vez
+de fallar con "database is locked". También se activan las claves foráneas,
+que SQLite ignora por defecto, para que funcionen los ``ON DELETE CASCADE``.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from app import db
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def engine_options(config):
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if is_sqlite(uri):
+        options.setdefault('connect_args', {}).setdefault('timeout', config['SQLITE_BUSY_TIMEOUT'] / 1000)
+    else:
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+    return options
+
+
+def _sqlite_pragmas(config):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if config['SQLITE_WAL']:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(config["SQLITE_BUSY_TIMEOUT"])}')
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+    return on_connect
+
+
+def init_database(app):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    db.init_app(app)
+    if is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        with app.app_context():
+            event.listen(db.engine, 'connect', _sqlite_pragmas(app.config))
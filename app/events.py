@@ -0,0 +1,173 @@
+"""Eventos en vivo de los sorteos activos (server-sent events).
+
+Cada worker tiene un solo hilo que, mientras haya clientes conectados, lee
+cada ``SSE_POLL_INTERVAL`` segundos los números restantes de todos los
+sorteos que alguien está mirando, con una sola consulta, y reparte el cambio
+a los clientes de cada sorteo. La base de datos hace de canal entre workers:
+mil compradores mirando la página cuestan una consulta por segundo por
+worker, no mil recargas de la página. Las compras hechas en el mismo worker
+se publican de inmediato con ``notify``.
+
+Cada conexión ocupa un hilo del worker mientras dura, así que ``SSE_MAX_CLIENTS``
+no puede pasar de los hilos del worker menos ``SSE_RESERVED_THREADS``; los
+clientes de más reciben 503 y la página sigue funcionando sin contador en vivo.
+
+Cada cliente tiene una cola de un solo elemento: solo importa el último
+estado, así un cliente lento nunca acumula eventos viejos.
+"""
+import json
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import Raffle
+
+
+class TooManyClients(Exception):
+    pass
+
+
+class RaffleEvents:
+    def __init__(self, app, poll_interval, max_clients):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._subscribers = {}  # raffle_id -> colas de sus clientes
+        self._clients = 0
+        self._thread = None
+        self._last = {}  # raffle_id -> restantes; None = sorteo cerrado
+
+    def subscribe(self, raffle_id):
+        client = queue.Queue(maxsize=1)
+        with self._lock:
+            if self._clients >= self.max_clients:
+                raise TooManyClients()
+            self._subscribers.setdefault(raffle_id, set()).add(client)
+            self._clients += 1
+            if raffle_id in self._last:
+                client.put_nowait((raffle_id, self._last[raffle_id]))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='raffle-events', daemon=True)
+                self._thread.start()
+        return client
+
+    def unsubscribe(self, raffle_id, client):
+        with self._lock:
+            clients = self._subscribers.get(raffle_id)
+            if clients is None or client not in clients:
+                return
+            clients.discard(client)
+            self._clients -= 1
+            if not clients:
+                del self._subscribers[raffle_id]
+                self._last.pop(raffle_id, None)
+
+    def publish(self, raffle_id, remaining):
+        state = (raffle_id, remaining)
+        with self._lock:
+            clients = self._subscribers.get(raffle_id)
+            if not clients or (raffle_id in self._last and self._last[raffle_id] == remaining):
+                return
+            self._last[raffle_id] = remaining
+            for client in clients:
+                try:
+                    client.get_nowait()
+                except queue.Empty:
+                    pass
+                client.put_nowait(state)
+
+    def notify(self, raffle_id):
+        # Llamar después del commit de una compra; no consulta nada si nadie está mirando ese sorteo
+        if raffle_id not in self._subscribers:
+            return
+        remaining = db.session.scalar(select(Raffle.available_count).where(Raffle.id == raffle_id))
+        self.publish(raffle_id, remaining)
+
+    def _read(self):
+        from app.cache import raffle_cache
+        with self._lock:
+            watched = list(self._subscribers)
+        active = {raffle.id: raffle.max_number for raffle in raffle_cache().active_raffles().values()}
+        ids = [raffle_id for raffle_id in watched if raffle_id in active]
+        counts = {}
+        if ids:
+            rows = db.session.execute(select(Raffle.id, Raffle.available_count).where(Raffle.id.in_(ids)))
+            counts = dict(rows.all())
+        states = {}
+        for raffle_id in watched:
+            if raffle_id not in active:
+                states[raffle_id] = None  # desactivado o eliminado
+            elif counts.get(raffle_id) is None:
+                states[raffle_id] = active[raffle_id]  # pool sin construir
+            else:
+                states[raffle_id] = counts[raffle_id]
+        return states
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        self._last.clear()
+                        return
+                try:
+                    for raffle_id, remaining in self._read().items():
+                        self.publish(raffle_id, remaining)
+                except Exception as e:
+                    self.app.logger.warning('No se pudo leer el estado de los sorteos: %s', e)
+                finally:
+                    db.session.remove()
+                time.sleep(self.poll_interval)
+
+
+def format_event(state):
+    raffle_id, remaining = state
+    if remaining is None:
+        name = 'closed'
+    elif remaining == 0:
+        name = 'sold_out'
+    else:
+        name = 'remaining'
+    return f'event: {name}\ndata: {json.dumps({"raffle_id": raffle_id, "remaining": remaining})}\n\n'
+
+
+def event_stream(events, raffle_id, client, keepalive, max_duration, retry_ms):
+    # La conexión se cierra después de max_duration y EventSource se reconecta solo,
+    # así un hilo de gunicorn no queda tomado indefinidamente
+    deadline = time.monotonic() + max_duration
+    try:
+        yield f'retry: {retry_ms}\n\n'
+        while time.monotonic() < deadline:
+            try:
+                state = client.get(timeout=min(keepalive, max(deadline - time.monotonic(), 0.1)))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(state)
+    finally:
+        events.unsubscribe(raffle_id, client)
+
+
+def init_events(app):
+    # Con más clientes que hilos libres, los streams dejarían al worker sin hilos para atender compras
+    free_threads = max(app.config['WORKER_THREADS'] - app.config['SSE_RESERVED_THREADS'], 0)
+    if app.config['SSE_MAX_CLIENTS'] > free_threads:
+        raise RuntimeError(
+            f"SSE_MAX_CLIENTS ({app.config['SSE_MAX_CLIENTS']}) no puede superar los hilos por worker "
+            f"({app.config['WORKER_THREADS']}) menos SSE_RESERVED_THREADS ({app.config['SSE_RESERVED_THREADS']})."
+        )
+    app.extensions['raffle_events'] = RaffleEvents(
+        app,
+        poll_interval=app.config['SSE_POLL_INTERVAL'],
+        max_clients=app.config['SSE_MAX_CLIENTS'],
+    )
+
+
+def raffle_events():
+    return current_app.extensions['raffle_events']
@@ -0,0 +1,114 @@
+"""Exportación de números vendidos y compradores en CSV / XLSX.
+
+Las filas se leen del cursor en bloques (``yield_per``) y se escriben al
+cliente a medida que llegan, con memoria constante sin importar cuántas
+filas tenga el sorteo.
+"""
+import csv
+import io
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import Person, Raffle, RaffleNumber, format_number
+from app.xlsx import stream_xlsx
+
+NUMBER_HEADER = ['Sorteo', 'Número', 'Nombre', 'Apellido', 'Correo', 'Dirección', 'Referencia', 'Confirmado',
+                 'Fecha de compra']
+PERSON_HEADER = ['ID', 'Sorteo', 'Nombre', 'Apellido', 'Correo', 'Dirección', 'Referencia', 'Confirmado',
+                 'Fecha de compra', 'Cantidad', 'Números']
+
+# Un valor que empieza con estos caracteres se interpreta como fórmula al abrir el CSV en Excel
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _filtered(stmt, raffle_id, confirmed):
+    if raffle_id is not None:
+        stmt = stmt.where(RaffleNumber.raffle_id == raffle_id)
+    if confirmed is True:
+        stmt = stmt.where(Person.confirmed.is_(True))
+    elif confirmed is False:
+        stmt = stmt.where(Person.confirmed.is_not(True))
+    return stmt
+
+
+def _rows(stmt):
+    return db.session.execute(stmt.execution_options(yield_per=current_app.config['EXPORT_CHUNK_SIZE']))
+
+
+def number_rows(raffle_id=None, confirmed=None):
+    stmt = _filtered(
+        select(Raffle.name, RaffleNumber.number, Raffle.max_number, Person.first_name, Person.last_name,
+               Person.email, Person.address, Person.reference_number, Person.confirmed, Person.created_at)
+        .join(Person, RaffleNumber.person_id == Person.id)
+        .join(Raffle, RaffleNumber.raffle_id == Raffle.id)
+        .order_by(RaffleNumber.raffle_id, RaffleNumber.number),
+        raffle_id, confirmed,
+    )
+    for name, number, max_number, *person in _rows(stmt):
+        yield [name, format_number(number, max_number), *person]
+
+
+def person_rows(raffle_id=None, confirmed=None):
+    # Una fila por número ordenada por persona; se agrupan aquí de a una persona a la vez
+    stmt = _filtered(
+        select(Person.id, Raffle.name, Person.first_name, Person.last_name, Person.email, Person.address,
+               Person.reference_number, Person.confirmed, Person.created_at, RaffleNumber.number,
+               Raffle.max_number)
+        .join(RaffleNumber, RaffleNumber.person_id == Person.id)
+        .join(Raffle, RaffleNumber.raffle_id == Raffle.id)
+        .order_by(Person.id, RaffleNumber.number),
+        raffle_id, confirmed,
+    )
+    current, numbers = None, []
+    for *person, number, max_number in _rows(stmt):
+        if current is not None and person[0] != current[0]:
+            yield [*current, len(numbers), ' '.join(numbers)]
+            numbers = []
+        current = person
+        numbers.append(format_number(number, max_number))
+    if current is not None:
+        yield [*current, len(numbers), ' '.join(numbers)]
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Sí' if value else 'No'
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(header, rows, flush_rows=1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel abra el archivo como UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % flush_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+EXPORTS = {
+    'numbers': (NUMBER_HEADER, number_rows, 'Números'),
+    'persons': (PERSON_HEADER, person_rows, 'Compradores'),
+}
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_stream(kind, fmt, raffle_id=None, confirmed=None):
+    header, rows, sheet_name = EXPORTS[kind]
+    if fmt == 'xlsx':
+        return stream_xlsx(header, rows(raffle_id, confirmed), sheet_name)
+    return stream_csv(header, rows(raffle_id, confirmed))
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, EmailField, SelectField, IntegerField, SubmitField, DateField,  PasswordField, ValidationError, FileField
-from wtforms.validators import DataRequired, Email, Optional, Length, EqualTo, NumberRange
+from flask_wtf.file import FileField as UploadField, FileRequired, FileAllowed
+from wtforms import StringField, EmailField, SelectField, IntegerField, SubmitField, DateField,  PasswordField, ValidationError, FileField, BooleanField, HiddenField, TextAreaField
+from wtforms.validators import DataRequired, InputRequired, Email, Optional, Length, EqualTo, NumberRange, Regexp
 import re
 
 
@@ -15,8 +16,49 @@ class RaffleForm(FlaskForm):
     bank_account = SelectField('Cuenta Bancaria', choices=[('', 'seleccionar Banco'), ('04142107454', 'Banesco')], validators=[DataRequired()])
 
 
+class AssignBlockForm(FlaskForm):
+    # También valida el JSON de /api/purchases (flask-wtf lee request.get_json())
+    raffle_id = SelectField('Sorteo', coerce=int, validators=[DataRequired()])
+    count = IntegerField('Cantidad de Números', validators=[InputRequired(), NumberRange(min=1, message="El número debe ser un entero positivo.")])
+    first_name = StringField('Nombre', validators=[DataRequired()])
+    last_name = StringField('Apellido', validators=[DataRequired()])
+    address = StringField('Dirección', validators=[DataRequired()])
+    reference_number = StringField('Referencia de Consignación', validators=[DataRequired()])
+    email = EmailField('Correo Electrónico', validators=[DataRequired(), Email()])
+    send_numbers = BooleanField('Pago confirmado: enviar los números por correo')
+    submit = SubmitField('Asignar Bloque')
+
+
+class ReconcileForm(FlaskForm):
+    raffle_id = SelectField('Sorteo', coerce=int, validators=[DataRequired()])
+    statement = UploadField('Estado de cuenta (CSV)', validators=[FileRequired(), FileAllowed(['csv', 'txt'], 'Solo se permiten archivos CSV.')])
+    submit = SubmitField('Conciliar')
+
+
+class ConfirmMatchesForm(FlaskForm):
+    raffle_id = HiddenField(validators=[DataRequired()])
+    person_ids = HiddenField(validators=[DataRequired()])  # ids separados por comas
+    submit = SubmitField('Confirmar y enviar números')
+
+
+class CommitDrawForm(FlaskForm):
+    prizes = TextAreaField('Premios (uno por línea, en el orden en que se sortean)', validators=[DataRequired()])
+    entropy_source = StringField('Fuente de entropía pública', validators=[DataRequired(), Length(max=255)])
+    submit = SubmitField('Publicar Commit')
+
+
+class RevealDrawForm(FlaskForm):
+    entropy = StringField('Valor de la fuente de entropía', validators=[DataRequired(), Length(max=255)])
+    submit = SubmitField('Revelar Ganadores')
+
+
+SLUG_VALIDATORS = [Optional(), Length(max=100),
+                   Regexp(r'^[a-z0-9]+(-[a-z0-9]+)*$', message='Solo letras minúsculas, números y guiones.')]
+
+
 class CreateRaffleForm(FlaskForm):
     name = StringField('Nombre del Sorteo', validators=[DataRequired()])
+    slug = StringField('Dirección pública (vacío = a partir del nombre)', validators=SLUG_VALIDATORS)
     start_date = DateField('Fecha de Inicio', format='%Y-%m-%d', validators=[DataRequired()])
     max_number = IntegerField('Máximo Número a Generar', validators=[DataRequired()])
     valor_numero = IntegerField('Valor por Número', validators=[DataRequired()])
@@ -48,6 +90,7 @@ class RegisterForm(FlaskForm):
 
 class EditRaffleForm(FlaskForm):
     name = StringField('Nombre del Sorteo', validators=[DataRequired(), Length(min=2, max=100)])
+    slug = StringField('Dirección pública', validators=SLUG_VALIDATORS)
     start_date = DateField('Fecha de Inicio', format='%Y-%m-%d', validators=[DataRequired()])
     max_number = IntegerField('Máximo Número a Generar', validators=[DataRequired()])
     valor_numero = IntegerField('Valor por Número', validators=[DataRequired()])
@@ -0,0 +1,118 @@
+"""Procesamiento de las imágenes de los sorteos.
+
+La imagen subida se lee en bloques para validar el tamaño y calcular su hash
+sin cargarla completa en memoria. Luego se generan variantes redimensionadas
+en JPEG y WebP con nombres basados en el hash (``<hash>-<variante>.<ext>``),
+así una imagen nueva nunca pisa a otra y cada archivo puede cachearse para
+siempre.
+"""
+import hashlib
+import os
+
+from flask import url_for
+
+from app.utils import allowed_file, MAX_CONTENT_LENGTH
+
+# (nombre, ancho máximo en píxeles)
+VARIANTS = (
+    ('thumb', 320),
+    ('mobile', 640),
+    ('desktop', 1280),
+)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+CHUNK_SIZE = 64 * 1024
+HASH_LENGTH = 16
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def _hash_upload(stream):
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_CONTENT_LENGTH:
+            raise InvalidImage('El tamaño de la imagen no puede exceder los 2 MB.')
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def variant_filename(image_hash, variant, extension):
+    return f'{image_hash}-{variant}.{extension}'
+
+
+def _save(image, path, format, **options):
+    # Se escribe a un archivo temporal y se renombra para no servir archivos a medias
+    tmp_path = f'{path}.tmp'
+    image.save(tmp_path, format, **options)
+    os.replace(tmp_path, path)
+
+
+def save_raffle_image(file, upload_folder):
+    if not allowed_file(file.filename):
+        raise InvalidImage('Solo se permiten archivos de imagen (png, jpg, jpeg, gif).')
+
+    image_hash = _hash_upload(file.stream)
+    names = [variant_filename(image_hash, name, ext) for name, _ in VARIANTS for ext in ('jpg', 'webp')]
+    if all(os.path.exists(os.path.join(upload_folder, name)) for name in names):
+        return image_hash
+
+    # Pillow solo hace falta al subir imágenes: no se carga en cada worker
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(file.stream)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except Exception as e:
+        raise InvalidImage('El archivo no es una imagen válida.') from e
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    for name, width in VARIANTS:
+        variant = image.copy()
+        variant.thumbnail((width, width * 4), Image.LANCZOS)
+        _save(variant, os.path.join(upload_folder, variant_filename(image_hash, name, 'jpg')), 'JPEG',
+              quality=JPEG_QUALITY, optimize=True, progressive=True)
+        _save(variant, os.path.join(upload_folder, variant_filename(image_hash, name, 'webp')), 'WEBP',
+              quality=WEBP_QUALITY, method=6)
+    return image_hash
+
+
+def raffle_image(raffle):
+    # Fuentes para <picture>/srcset; los sorteos anteriores solo tienen el archivo original
+    if raffle is None:
+        return None
+    image_hash = raffle.image_hash
+    if image_hash:
+        def srcset(extension):
+            return ', '.join(
+                f"{url_for('auth.media_images', filename=variant_filename(image_hash, name, extension))} {width}w"
+                for name, width in VARIANTS
+            )
+        return {
+            'src': url_for('auth.media_images', filename=variant_filename(image_hash, 'desktop', 'jpg')),
+            'jpeg': srcset('jpg'),
+            'webp': srcset('webp'),
+        }
+    if raffle.image_filename:
+        return {'src': url_for('auth.media_images', filename=raffle.image_filename), 'jpeg': None, 'webp': None}
+    return None
+
+
+def init_images(app):
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    app.add_template_global(raffle_image)
@@ -0,0 +1,90 @@
+"""Conteo de consultas SQL.
+
+Cada petición acumula en ``g.query_stats`` cuántas consultas hizo y cuánto
+tardaron. ``count_queries()`` permite medir un bloque de código cualquiera,
+por ejemplo en pruebas o benchmarks, para detectar regresiones N+1.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+_installed = False
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = []
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.time += elapsed
+        self.statements.append(statement)
+
+
+def _collectors():
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+
+@contextmanager
+def count_queries():
+    stats = QueryStats()
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    for stats in _collectors():
+        stats.record(statement, elapsed)
+
+
+def _start_request():
+    g.query_stats = QueryStats()
+    _collectors().append(g.query_stats)
+
+
+def _add_headers(response):
+    stats = g.get('query_stats')
+    if stats is None:
+        return response
+    if current_app.config['SQL_STATS_HEADERS']:
+        response.headers['X-SQL-Count'] = str(stats.count)
+        response.headers['X-SQL-Time'] = f'{stats.time * 1000:.2f}ms'
+    threshold = current_app.config['SQL_QUERY_WARNING_THRESHOLD']
+    if threshold and stats.count > threshold:
+        current_app.logger.warning('%s hizo %d consultas SQL (%.2f ms)', request.endpoint,
+                                   stats.count, stats.time * 1000)
+    return response
+
+
+def _end_request(exc):
+    stats = g.pop('query_stats', None)
+    if stats is not None and stats in _collectors():
+        _collectors().remove(stats)
+
+
+def init_instrumentation(app):
+    global _installed
+    if not _installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _installed = True
+    app.before_request(_start_request)
+    app.after_request(_add_headers)
+    app.teardown_request(_end_request)
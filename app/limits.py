@@ -0,0 +1,54 @@
+"""Límites de peticiones para el formulario público de compra.
+
+Los contadores viven en ``RATELIMIT_STORAGE_URI``: ``memory://`` sirve para
+desarrollo y pruebas, pero cada worker de gunicorn tendría los suyos; en
+producción se usa un almacenamiento compartido (``redis://...``). El límite
+se revisa antes de la vista, así una petición rechazada no toca la base de
+datos ni calcula los números disponibles.
+
+Si el almacenamiento no responde las peticiones pasan sin límite
+(``RATELIMIT_SWALLOW_ERRORS``): es preferible no bloquear las ventas.
+"""
+from flask import current_app, flash, jsonify, redirect, request, url_for
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+limiter = Limiter(key_func=get_remote_address)
+
+# Páginas con el formulario de compra: la portada y la de cada sorteo
+PURCHASE_ENDPOINTS = {'raffle.index', 'raffle.raffle_page'}
+
+
+def email_key():
+    # El mismo correo desde varias IP cuenta una sola vez; sin correo se limita por IP
+    email = (request.form.get('email') or '').strip().lower()
+    return f'email:{email}' if email else get_remote_address()
+
+
+def configured(key):
+    # Los límites se leen de la configuración en cada petición (limit_value acepta una función)
+    return lambda: current_app.config[key]
+
+
+def purchase_limits(view):
+    # Los contadores por IP y por correo son compartidos por todas las páginas de compra
+    view = limiter.shared_limit(configured('RATELIMIT_PURCHASE_EMAIL'), 'purchase-email', key_func=email_key,
+                                methods=['POST'])(view)
+    return limiter.shared_limit(configured('RATELIMIT_PURCHASE_IP'), 'purchase-ip', methods=['POST'])(view)
+
+
+def _too_many_requests(e):
+    # El formulario público responde como a cualquier otro error de compra: mensaje y vuelta a la página
+    if request.endpoint in PURCHASE_ENDPOINTS:
+        flash('Demasiados intentos de compra. Espera unos minutos y vuelve a intentarlo.', 'error')
+        return redirect(url_for(request.endpoint, **request.view_args))
+    return jsonify({'error': 'Demasiadas solicitudes. Intenta más tarde.'}), 429
+
+
+def init_limits(app):
+    # Detrás de N proxies (nginx, Heroku) la IP real viene en X-Forwarded-For; sin proxy no se confía en ella
+    if app.config['PROXY_COUNT']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'], x_proto=app.config['PROXY_COUNT'])
+    limiter.init_app(app)
+    app.register_error_handler(429, _too_many_requests)
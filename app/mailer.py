@@ -0,0 +1,194 @@
+"""Cola de correos persistida en la base de datos.
+
+Las vistas solo encolan ``EmailMessage``; el worker (``flask send-emails``)
+toma lotes de mensajes pendientes, los envía reutilizando una sola conexión
+SMTP y reintenta con espera exponencial. Los correos de tipo ``numbers``
+marcan a la persona como confirmada solo cuando se entregan.
+"""
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message
+from markupsafe import escape
+from sqlalchemy import and_, or_, select, update
+
+from app import db, mail
+from app.allocation import chunked
+from app.metrics import registry, timed
+from app.models import EmailMessage, Person, Raffle, RaffleNumber, format_number
+
+# Un mensaje tomado por un worker que murió vuelve a la cola después de este tiempo
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def numbers_email_html(numbers):
+    return (f'<html>'
+            f'<body style="font-family: Arial, sans-serif; color: #333; background-color: #f4f4f9;">'
+            f'<h2 style="color: #3498db;">¡Hola!</h2>'
+            f'<p><strong>Tus números de la rifa son:</strong></p>'
+            f'<p style="font-size: 16px;">{escape(", ".join(map(str, numbers)))}</p>'
+            f'<hr style="border: 1px solid #ddd;">'
+            f'<p>¡Gracias por participar!</p>'
+            f'<p>El equipo de Poison G</p>'
+            f'</body>'
+            f'</html>')
+
+
+def purchase_email_html(person, raffle, count):
+    # Los datos los escribe el comprador: se escapan para no inyectar HTML en un correo a nombre de la rifa
+    return (f'<html>'
+            f'<body style="font-family: Arial, sans-serif; color: #333; background-color: #f4f4f9;">'
+            f'<h2 style="color: #3498db;">¡Hola {escape(person.first_name)}!</h2>'
+            f'<p>Recibimos tu solicitud de <strong>{escape(count)}</strong> números para <strong>{escape(raffle.name)}</strong>.</p>'
+            f'<p>Cuando confirmemos tu pago (referencia {escape(person.reference_number)}) te enviaremos tus números.</p>'
+            f'<hr style="border: 1px solid #ddd;">'
+            f'<p>El equipo de Poison G</p>'
+            f'</body>'
+            f'</html>')
+
+
+def _has_pending(person_id, kind):
+    return db.session.scalar(
+        select(EmailMessage.id).where(EmailMessage.person_id == person_id, EmailMessage.kind == kind,
+                                      EmailMessage.status.in_(['pending', 'sending'])).limit(1)
+    ) is not None
+
+
+def enqueue_numbers_email(person, numbers=None):
+    if person.confirmed or _has_pending(person.id, 'numbers'):
+        return None
+    if numbers is None:
+        numbers = [number.raffle.format_number(number.number) for number in person.raffle_numbers]
+    message = EmailMessage(person_id=person.id, kind='numbers', recipient=person.email,
+                           subject='Tus números de la rifa', html=numbers_email_html(numbers))
+    db.session.add(message)
+    return message
+
+
+def enqueue_purchase_email(person, raffle, count):
+    message = EmailMessage(person_id=person.id, kind='purchase', recipient=person.email,
+                           subject=f'Recibimos tu solicitud - {raffle.name}',
+                           html=purchase_email_html(person, raffle, count))
+    db.session.add(message)
+    return message
+
+
+def enqueue_raffle_numbers(raffle_id, person_ids=None):
+    # Encola los números de las personas sin confirmar del sorteo (todas o solo person_ids)
+    # sin cargar los objetos
+    if person_ids is None:
+        return _enqueue_numbers(raffle_id)
+    return sum(_enqueue_numbers(raffle_id, Person.id.in_(chunk)) for chunk in chunked(person_ids))
+
+
+def _enqueue_numbers(raffle_id, *conditions):
+    pending = select(EmailMessage.person_id).where(EmailMessage.kind == 'numbers',
+                                                   EmailMessage.status.in_(['pending', 'sending']),
+                                                   EmailMessage.person_id.is_not(None))
+    rows = db.session.execute(
+        select(Person.id, Person.email, RaffleNumber.number, Raffle.max_number)
+        .join(RaffleNumber, RaffleNumber.person_id == Person.id)
+        .join(Raffle, RaffleNumber.raffle_id == Raffle.id)
+        .where(RaffleNumber.raffle_id == raffle_id, Person.confirmed.is_(False), Person.id.not_in(pending),
+               *conditions)
+        .order_by(Person.id, RaffleNumber.number)
+    )
+    persons = {}
+    for person_id, email, number, max_number in rows:
+        persons.setdefault(person_id, (email, []))[1].append(format_number(number, max_number))
+
+    now = datetime.utcnow()
+    messages = [
+        {'person_id': person_id, 'kind': 'numbers', 'recipient': email, 'subject': 'Tus números de la rifa',
+         'html': numbers_email_html(numbers), 'status': 'pending', 'attempts': 0,
+         'next_attempt_at': now, 'created_at': now}
+        for person_id, (email, numbers) in persons.items()
+    ]
+    if messages:
+        db.session.execute(EmailMessage.__table__.insert(), messages)
+    return len(messages)
+
+
+def _claim_batch(batch_size):
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    claimable = or_(and_(EmailMessage.status == 'pending', EmailMessage.next_attempt_at <= now),
+                    and_(EmailMessage.status == 'sending', EmailMessage.claimed_at < now - CLAIM_TIMEOUT))
+    # Con varios workers en Postgres: SKIP LOCKED reparte filas distintas a cada uno y la condición se
+    # vuelve a comprobar en el UPDATE, así una fila que otro worker ya tomó no se reclama dos veces
+    due = (
+        select(EmailMessage.id)
+        .where(claimable)
+        .order_by(EmailMessage.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    db.session.execute(
+        update(EmailMessage)
+        .where(EmailMessage.id.in_(due.scalar_subquery()), claimable)
+        .values(status='sending', claimed_at=now, claim_token=token)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return db.session.scalars(select(EmailMessage).where(EmailMessage.claim_token == token,
+                                                         EmailMessage.status == 'sending')).all()
+
+
+def _mark_failed(message, error):
+    message.attempts += 1
+    message.last_error = str(error)
+    if message.attempts >= current_app.config['MAIL_MAX_ATTEMPTS']:
+        message.status = 'failed'
+    else:
+        message.status = 'pending'
+        backoff = current_app.config['MAIL_RETRY_BACKOFF'] * 2 ** (message.attempts - 1)
+        message.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+
+
+def deliver_pending(batch_size=None):
+    messages = _claim_batch(batch_size or current_app.config['MAIL_BATCH_SIZE'])
+    if not messages:
+        return 0
+
+    sent = 0
+    try:
+        # Una sola conexión SMTP para todo el lote
+        with mail.connect() as connection:
+            for message in messages:
+                try:
+                    with timed('rifa_smtp_duration_seconds'):
+                        connection.send(Message(message.subject, recipients=[message.recipient], html=message.html))
+                except Exception as e:
+                    _mark_failed(message, e)
+                else:
+                    message.status = 'sent'
+                    message.sent_at = datetime.utcnow()
+                    if message.kind == 'numbers' and message.person is not None:
+                        message.person.confirmed = True
+                    sent += 1
+                db.session.commit()
+    except Exception as e:
+        # No se pudo abrir la conexión: todo lo que quedó tomado vuelve a la cola
+        db.session.rollback()
+        current_app.logger.warning('No se pudo conectar al servidor SMTP: %s', e)
+        registry.inc('rifa_smtp_connection_errors_total')
+        for message in messages:
+            if message.status == 'sending':
+                _mark_failed(message, e)
+        db.session.commit()
+    return sent
+
+
+def run_worker(interval, once=False):
+    while True:
+        sent = deliver_pending()
+        if sent:
+            current_app.logger.info('Correos enviados: %d', sent)
+        # Los tiempos SMTP de este proceso también aparecen en /metrics (si comparte la carpeta instance)
+        registry.flush(force=once)
+        if once:
+            return
+        if not sent:
+            time.sleep(interval)
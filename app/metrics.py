@@ -0,0 +1,292 @@
+"""Métricas de rendimiento en formato Prometheus y perfilador por petición.
+
+Cada proceso acumula en ``registry``: latencia por endpoint, consultas SQL y
+su tiempo (a partir de ``g.query_stats`` de app.instrumentation), llamadas
+HTTP salientes (tasa de cambio) y envíos SMTP. Como gunicorn reparte los
+scrapes entre workers, cada proceso vuelca su registro cada
+``METRICS_FLUSH_INTERVAL`` segundos en ``<METRICS_DIR>/<pid>.json`` (por
+defecto ``instance/metrics``) y ``/metrics`` suma todos los archivos. Al
+terminar, cada proceso suma su registro a ``retired.json`` y borra su archivo,
+así los contadores no bajan y un pid reutilizado no pisa datos ajenos. El
+maestro de gunicorn vacía el directorio al arrancar (``gunicorn.conf.py``),
+como el modo multiproceso de prometheus_client.
+
+Un administrador puede activar el perfilador para su sesión: cada petición
+suya corre bajo cProfile y el resultado queda en ``instance/profiles``.
+"""
+import atexit
+import cProfile
+import fcntl
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import current_app, g, request, session
+from flask_login import current_user
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# nombre -> (tipo, descripción)
+METRICS = {
+    'rifa_http_request_duration_seconds': ('histogram', 'Duración de las peticiones por endpoint.'),
+    'rifa_http_requests_total': ('counter', 'Peticiones por endpoint, método y código de estado.'),
+    'rifa_sql_queries_total': ('counter', 'Consultas SQL hechas por endpoint.'),
+    'rifa_sql_duration_seconds_total': ('counter', 'Tiempo en consultas SQL por endpoint.'),
+    'rifa_outbound_http_duration_seconds': ('histogram', 'Duración de las llamadas HTTP salientes.'),
+    'rifa_smtp_duration_seconds': ('histogram', 'Duración de cada envío SMTP.'),
+    'rifa_smtp_connection_errors_total': ('counter', 'Lotes de correo sin conexión al servidor SMTP.'),
+}
+
+RETIRED_FILE = 'retired.json'
+LOCK_FILE = 'metrics.lock'
+
+# Endpoints que no se perfilan: las páginas del propio perfilador, los estáticos y las rutas inexistentes
+PROFILER_SKIP = {'metrics.profiler', 'metrics.profile_detail', 'metrics.toggle_profiler', 'static', None}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.counters = {}  # (nombre, etiquetas) -> valor
+        self.histograms = {}  # (nombre, etiquetas) -> [conteo por bucket..., +Inf, suma]
+        self.directory = None
+        self.flush_interval = None
+        self._flushed_at = 0
+        self._flushed_pid = None  # los workers heredan el registro del maestro al bifurcarse
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            histogram[bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in self.histograms.items()],
+            }
+
+    def path(self):
+        return os.path.join(self.directory, f'{os.getpid()}.json')
+
+    def flush(self, force=False):
+        if self.directory is None or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            if not force and now - self._flushed_at < self.flush_interval:
+                return
+            path = self.path()
+            if self._flushed_pid != os.getpid():
+                # Primer volcado de este proceso: un archivo con su pid es de un proceso anterior
+                if os.path.exists(path):
+                    retire(self.directory, path)
+                self._flushed_pid = os.getpid()
+            with open(f'{path}.tmp', 'w') as fp:
+                json.dump(self.snapshot(), fp)
+            os.replace(f'{path}.tmp', path)
+            self._flushed_at = now
+        finally:
+            self._flush_lock.release()
+
+    def retire(self):
+        # Al terminar el proceso: su registro pasa a retired.json
+        if self.directory is None or (not self.counters and not self.histograms):
+            return
+        self.flush(force=True)
+        if os.path.exists(self.path()):
+            retire(self.directory, self.path())
+
+
+registry = Registry()
+atexit.register(registry.retire)
+
+
+@contextmanager
+def timed(name, **labels):
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        registry.observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+
+
+@contextmanager
+def _locked(directory, operation):
+    # Serializa el paso de un archivo a retired.json con las lecturas de /metrics (flock entre procesos)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read(path, counters, histograms):
+    try:
+        with open(path) as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        total = histograms.setdefault(key, [0] * len(values))
+        histograms[key] = [a + b for a, b in zip(total, values)]
+
+
+def retire(directory, path):
+    # Suma el archivo de un proceso terminado a retired.json y lo borra
+    retired = os.path.join(directory, RETIRED_FILE)
+    with _locked(directory, fcntl.LOCK_EX):
+        counters, histograms = {}, {}
+        _read(retired, counters, histograms)
+        _read(path, counters, histograms)
+        with open(f'{retired}.tmp', 'w') as fp:
+            json.dump({
+                'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+            }, fp)
+        os.replace(f'{retired}.tmp', retired)
+        os.remove(path)
+
+
+def clear(directory):
+    # Al arrancar el maestro: los registros de una ejecución anterior no se suman
+    if not os.path.isdir(directory):
+        return
+    with _locked(directory, fcntl.LOCK_EX):
+        for filename in os.listdir(directory):
+            if filename.endswith(('.json', '.tmp')):
+                os.remove(os.path.join(directory, filename))
+
+
+def collect(directory):
+    # Suma los registros volcados por todos los procesos
+    counters, histograms = {}, {}
+    with _locked(directory, fcntl.LOCK_SH):
+        for filename in os.listdir(directory):
+            if filename.endswith('.json'):
+                _read(os.path.join(directory, filename), counters, histograms)
+    return counters, histograms
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(counters, histograms):
+    series = {}
+    for (name, labels), value in sorted(counters.items()):
+        series.setdefault(name, []).append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), values in sorted(histograms.items()):
+        lines = series.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), values):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {values[-1]}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+    output = []
+    for name in sorted(series):
+        kind, description = METRICS.get(name, ('untyped', ''))
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(series[name])
+    return '\n'.join(output) + '\n'
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    # Solo se mira la sesión; el usuario se carga únicamente si el perfilador está activo
+    if session.get('profiler') and request.endpoint not in PROFILER_SKIP and current_user.is_authenticated:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _record_request(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _save_profile(profiler, response)
+
+    started = g.get('request_started')
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    registry.observe('rifa_http_request_duration_seconds', time.perf_counter() - started,
+                     endpoint=endpoint, method=request.method)
+    registry.inc('rifa_http_requests_total', endpoint=endpoint, method=request.method,
+                 status=str(response.status_code))
+    stats = g.get('query_stats')
+    if stats is not None and stats.count:
+        registry.inc('rifa_sql_queries_total', stats.count, endpoint=endpoint)
+        registry.inc('rifa_sql_duration_seconds_total', stats.time, endpoint=endpoint)
+    registry.flush()
+    return response
+
+
+def profiles_directory():
+    return os.path.join(current_app.instance_path, 'profiles')
+
+
+def _save_profile(profiler, response):
+    elapsed = time.perf_counter() - g.request_started
+    stream = io.StringIO()
+    stream.write(f'{request.method} {request.full_path.rstrip("?")} -> {response.status_code} '
+                 f'en {elapsed * 1000:.1f} ms\n\n')
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(current_app.config['PROFILER_LINES'])
+
+    directory = profiles_directory()
+    os.makedirs(directory, exist_ok=True)
+    filename = f'{time.time_ns()}-{request.endpoint or "unmatched"}.txt'
+    with open(os.path.join(directory, filename), 'w') as fp:
+        fp.write(stream.getvalue())
+    for old in list_profiles()[current_app.config['PROFILER_KEEP']:]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    directory = profiles_directory()
+    if not os.path.isdir(directory):
+        return []
+    return sorted((name for name in os.listdir(directory) if name.endswith('.txt')), reverse=True)
+
+
+def metrics_directory(app):
+    return app.config['METRICS_DIR'] or os.path.join(app.instance_path, 'metrics')
+
+
+def init_metrics(app):
+    registry.directory = metrics_directory(app)
+    registry.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+    os.makedirs(registry.directory, exist_ok=True)
+    app.before_request(_start_request)
+    app.after_request(_record_request)
@@ -1,6 +1,32 @@
+import re
+import unicodedata
+from datetime import datetime
+
 from app import db, login_manager
 from flask_login import UserMixin
 
+
+def format_number(number, max_number):
+    # Los números se guardan como enteros; el relleno con ceros es solo para mostrarlos
+    return str(number).zfill(len(str(max_number)))
+
+
+def normalize_reference(reference):
+    # Referencia bancaria comparable: solo letras y dígitos, en mayúsculas y sin ceros a la izquierda
+    key = re.sub(r'[^0-9A-Za-z]', '', reference or '').upper().lstrip('0')
+    return key or None
+
+
+def slugify(name):
+    # Dirección pública del sorteo: minúsculas sin acentos, palabras separadas por guiones
+    ascii_name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '-', ascii_name.lower()).strip('-')[:100] or 'sorteo'
+
+
+def _default_slug(context):
+    return slugify(context.get_current_parameters().get('name'))
+
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
@@ -17,34 +43,167 @@ class Person(db.Model):
     last_name = db.Column(db.String(50), nullable=False)
     address = db.Column(db.String(200), nullable=False)
     reference_number = db.Column(db.String(100), nullable=False)
+    reference_key = db.Column(db.String(100), index=True)  # normalize_reference(reference_number), para conciliar y buscar
     email = db.Column(db.String(120), nullable=False)
     confirmed = db.Column(db.Boolean, default=False) # Confirmar si la persona ha pagado
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
-    # Relación uno a muchos con RaffleNumber
-    raffle_numbers = db.relationship('RaffleNumber', backref='person', lazy=True)
+    # La búsqueda de las listas compara el email sin distinguir mayúsculas
+    __table_args__ = (db.Index('ix_person_email_lower', db.func.lower(email)),)
+
+    # Relación uno a muchos con RaffleNumber; la base de datos borra los números en cascada
+    raffle_numbers = db.relationship('RaffleNumber', backref='person', lazy=True,
+                                     cascade='all, delete', passive_deletes=True)
+
+    @db.validates('reference_number')
+    def _set_reference_key(self, key, value):
+        self.reference_key = normalize_reference(value)
+        return value
 
 
 class RaffleNumber(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    number = db.Column(db.String(10), nullable=False)
-    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False)
-    raffle_id = db.Column(db.Integer, db.ForeignKey('raffle.id'), nullable=False)
+    number = db.Column(db.Integer, nullable=False)
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id', ondelete='CASCADE'), nullable=False, index=True)
+    raffle_id = db.Column(db.Integer, db.ForeignKey('raffle.id', ondelete='CASCADE'), nullable=False)
 
     # Relación con el modelo Raffle
-    raffle = db.relationship('Raffle', backref='raffle_numbers', lazy=True)
+    raffle = db.relationship('Raffle', lazy=True,
+                             backref=db.backref('raffle_numbers', cascade='all, delete', passive_deletes=True))
 
     #combinacion unica de sorteo y numero
     __table_args__ = (
         db.UniqueConstraint('number', 'raffle_id', name='uix_number_raffle_id'),
+        # paginación por sorteo en las vistas de administración
+        db.Index('ix_raffle_number_raffle_id_id', 'raffle_id', 'id'),
     )
 
 
 class Raffle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
+    slug = db.Column(db.String(100), unique=True, nullable=False, default=_default_slug)  # /raffle/<slug>
     start_date = db.Column(db.Date, nullable=False)
     active = db.Column(db.Boolean, default=True)
     max_number = db.Column(db.Integer, nullable=False)
     valor_numero = db.Column(db.Integer, nullable=False)
     image_filename = db.Column(db.String(255))  # Campo para almacenar el nombre del archivo de la imagen
+    image_hash = db.Column(db.String(16))  # Prefijo de las variantes generadas por app.images
+    available_count = db.Column(db.Integer)  # Números libres en el pool (None = pool sin construir)
+
+    # La caché de la página pública carga todos los sorteos activos en una consulta
+    __table_args__ = (db.Index('ix_raffle_active_slug', 'active', 'slug'),)
+
+    def format_number(self, number):
+        return format_number(number, self.max_number)
+
+
+class NumberPoolSlot(db.Model):
+    # Posiciones del pool de números libres que no contienen su valor por defecto (slot + 1)
+    raffle_id = db.Column(db.Integer, db.ForeignKey('raffle.id', ondelete='CASCADE'), primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    number = db.Column(db.Integer, nullable=False)
+
+
+class ExchangeRate(db.Model):
+    # Última tasa obtenida, compartida por todos los workers
+    currency = db.Column(db.String(3), primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
+    fetched_at = db.Column(db.Float, nullable=False)  # timestamp unix
+    refresh_claimed_at = db.Column(db.Float)  # worker que está actualizando la tasa
+
+
+class EmailMessage(db.Model):
+    # Cola de correos; el worker `flask send-emails` los entrega en lotes
+    id = db.Column(db.Integer, primary_key=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id', ondelete='CASCADE'), index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'numbers' confirma a la persona al entregarse
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    claim_token = db.Column(db.String(32), index=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    person = db.relationship('Person', lazy=True,
+                             backref=db.backref('emails', cascade='all, delete', passive_deletes=True))
+
+    __table_args__ = (
+        db.Index('ix_email_message_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
 
+class ArchivedRaffle(db.Model):
+    # Sorteos archivados: se copian aquí y se eliminan de las tablas principales
+    id = db.Column(db.Integer, primary_key=True)
+    raffle_id = db.Column(db.Integer, nullable=False)  # id que tenía el sorteo (SQLite puede reutilizarlo)
+    name = db.Column(db.String(100), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    max_number = db.Column(db.Integer, nullable=False)
+    valor_numero = db.Column(db.Integer, nullable=False)
+    image_filename = db.Column(db.String(255))
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    numbers = db.relationship('ArchivedRaffleNumber', backref='archived_raffle', lazy=True,
+                              cascade='all, delete', passive_deletes=True)
+
+
+class ArchivedRaffleNumber(db.Model):
+    # Número vendido con los datos del comprador copiados (las personas se eliminan)
+    id = db.Column(db.Integer, primary_key=True)
+    archived_raffle_id = db.Column(db.Integer, db.ForeignKey('archived_raffle.id', ondelete='CASCADE'),
+                                   nullable=False, index=True)
+    number = db.Column(db.Integer, nullable=False)
+    first_name = db.Column(db.String(50), nullable=False)
+    last_name = db.Column(db.String(50), nullable=False)
+    address = db.Column(db.String(200), nullable=False)
+    reference_number = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    confirmed = db.Column(db.Boolean)
+    created_at = db.Column(db.DateTime)
+
+
+class Draw(db.Model):
+    # Sorteo de ganadores por commit-reveal (ver app.draws); una vez revelado no cambia
+    id = db.Column(db.Integer, primary_key=True)
+    # Queda en NULL si el sorteo se archiva o elimina; el resultado se conserva
+    raffle_id = db.Column(db.Integer, db.ForeignKey('raffle.id', ondelete='SET NULL'), unique=True)
+    raffle_name = db.Column(db.String(100), nullable=False)
+    prizes = db.Column(db.Text, nullable=False)  # JSON: nombres de los premios en orden de sorteo
+    seed_hash = db.Column(db.String(64), nullable=False)  # sha256 de la semilla, público desde el commit
+    seed = db.Column(db.String(64), nullable=False)  # secreta hasta revelar
+    entropy_source = db.Column(db.String(255))  # fuente pública anunciada en el commit
+    entropy = db.Column(db.String(255))  # valor de esa fuente, ingresado al revelar
+    committed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    revealed_at = db.Column(db.DateTime)
+    # Números vendidos fijados en el commit y publicados con el resultado
+    max_number = db.Column(db.Integer)  # el bitmap tiene max_number // 8 + 1 bytes
+    sold_bitmap = db.deferred(db.Column(db.LargeBinary))  # bit n encendido = número n vendido
+    sold_count = db.Column(db.Integer)
+    sold_digest = db.Column(db.String(64))  # sha256 del bitmap de números vendidos
+    result_digest = db.Column(db.String(64))  # sha256 del resultado canónico
+
+    raffle = db.relationship('Raffle', lazy=True,
+                             backref=db.backref('draw', uselist=False, passive_deletes=True))
+    winners = db.relationship('DrawWinner', backref='draw', lazy=True, order_by='DrawWinner.tier')
+
+
+class DrawWinner(db.Model):
+    # Ganador con los datos del comprador copiados: sobrevive al archivo del sorteo
+    id = db.Column(db.Integer, primary_key=True)
+    draw_id = db.Column(db.Integer, db.ForeignKey('draw.id'), nullable=False, index=True)
+    tier = db.Column(db.Integer, nullable=False)  # posición del premio en Draw.prizes
+    prize = db.Column(db.String(200), nullable=False)
+    number = db.Column(db.Integer, nullable=False)
+    first_name = db.Column(db.String(50), nullable=False)
+    last_name = db.Column(db.String(50), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('draw_id', 'tier', name='uix_draw_winner_draw_id_tier'),
+    )
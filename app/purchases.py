@@ -0,0 +1,93 @@
+"""Compra atómica de números.
+
+Toda la compra (persona, pool y números) ocurre en una sola transacción. La
+primera sentencia escribe sobre la fila del sorteo, lo que toma el bloqueo de
+escritura en SQLite y el bloqueo de fila en Postgres, así las compras de un
+mismo sorteo se serializan entre workers. Si aun así un número choca con
+``uix_number_raffle_id`` solo se vuelven a sortear los números en conflicto.
+
+Los números se insertan con un solo ``INSERT`` de varias filas (executemany),
+sin crear un objeto ORM por número, así un bloque de miles de números cuesta
+casi lo mismo por número que una compra de cinco.
+"""
+import random
+import time
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import db
+from app.allocation import chunked, draw_numbers
+from app.mailer import enqueue_numbers_email, enqueue_purchase_email
+from app.models import Person, Raffle, RaffleNumber
+
+# Reintentos de la transacción completa (p. ej. "database is locked")
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.05  # segundos, se duplica en cada intento
+
+# Veces que se vuelven a sortear los números en conflicto dentro de una compra
+MAX_REDRAWS = 3
+
+
+class PurchaseFailed(Exception):
+    pass
+
+
+def lock_raffle(raffle_id):
+    # Toma el bloqueo de escritura del sorteo (ver docstring del módulo)
+    db.session.execute(
+        update(Raffle).where(Raffle.id == raffle_id).values(available_count=Raffle.available_count)
+    )
+    return db.session.get(Raffle, raffle_id, populate_existing=True)
+
+
+def _insert_numbers(raffle, person, numbers):
+    for _ in range(MAX_REDRAWS + 1):
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(RaffleNumber), [
+                    {'number': number, 'person_id': person.id, 'raffle_id': raffle.id}
+                    for number in numbers
+                ])
+            return numbers
+        except IntegrityError:
+            taken = set()
+            for chunk in chunked(numbers):
+                taken.update(db.session.scalars(
+                    select(RaffleNumber.number).where(
+                        RaffleNumber.raffle_id == raffle.id,
+                        RaffleNumber.number.in_(chunk),
+                    )
+                ))
+            kept = [number for number in numbers if number not in taken]
+            # Los números en conflicto ya salieron del pool, solo se reemplazan
+            numbers = kept + draw_numbers(raffle, len(numbers) - len(kept))
+    raise PurchaseFailed('No fue posible reservar los números, intenta de nuevo.')
+
+
+def purchase_numbers(raffle_id, count, send_numbers=False, **person_fields):
+    # send_numbers: el pago ya está confirmado (bloques asignados por un admin), se
+    # envían los números directamente en vez del correo de solicitud recibida
+    for attempt in range(MAX_RETRIES):
+        try:
+            raffle = lock_raffle(raffle_id)
+            numbers = draw_numbers(raffle, count)
+
+            person = Person(**person_fields)
+            db.session.add(person)
+            db.session.flush()
+
+            numbers = _insert_numbers(raffle, person, numbers)
+            if send_numbers:
+                enqueue_numbers_email(person, [raffle.format_number(number) for number in sorted(numbers)])
+            else:
+                enqueue_purchase_email(person, raffle, len(numbers))
+            db.session.commit()
+            return person, numbers
+        except OperationalError:
+            db.session.rollback()
+            time.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+        except Exception:
+            db.session.rollback()
+            raise
+    raise PurchaseFailed('El sistema está ocupado, intenta de nuevo en unos segundos.')
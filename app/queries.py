@@ -0,0 +1,217 @@
+"""Consultas paginadas para las vistas de administración.
+
+La paginación es por cursor (keyset): el cursor guarda el valor de la columna
+ordenada y el id de la última fila, así cada página es una búsqueda en el
+índice sin importar qué tan adelante esté. Si no hay cursor (por ejemplo al
+saltar a una página desde datatables) se usa ``start`` como offset.
+
+Los totales se cuentan solo en las páginas sin cursor, sobre la tabla base y
+sin joins; las páginas por cursor devuelven ``recordsTotal`` y
+``recordsFiltered`` en ``null`` y el cliente reutiliza los de la primera
+página. La búsqueda es exacta (email sin distinguir mayúsculas, referencia
+normalizada o número) para que cada condición use un índice.
+"""
+import base64
+import json
+
+from flask import request
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.models import Person, Raffle, RaffleNumber, format_number, normalize_reference
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+NUMBER_COLUMNS = {
+    'id': RaffleNumber.id,
+    'raffle_id': RaffleNumber.raffle_id,
+    'number': RaffleNumber.number,
+    'email': Person.email,
+    'first_name': Person.first_name,
+    'last_name': Person.last_name,
+    'reference_number': Person.reference_number,
+}
+
+PERSON_COLUMNS = {
+    'id': Person.id,
+    'first_name': Person.first_name,
+    'last_name': Person.last_name,
+    'email': Person.email,
+    'reference_number': Person.reference_number,
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        return None
+    return values if isinstance(values, list) and len(values) == 2 else None
+
+
+def page_params(columns):
+    args = request.args
+    order = args.get('order', 'id')
+    return {
+        'draw': args.get('draw', 0, type=int),
+        'length': min(max(args.get('length', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE),
+        'start': max(args.get('start', 0, type=int), 0),
+        'cursor': decode_cursor(args['cursor']) if args.get('cursor') else None,
+        'order': order if order in columns else 'id',
+        'descending': args.get('dir') == 'desc',
+        'search': args.get('search', '').strip(),
+        'raffle_id': args.get('raffle_id', type=int),
+    }
+
+
+def paginate(filtered_stmt, columns, id_column, params, count_total, searched):
+    sort_column = columns[params['order']]
+    if params['cursor'] is not None:
+        records_total = records_filtered = None
+    else:
+        records_total = db.session.scalar(count_total)
+        # Sin búsqueda el filtro es el total: no se cuenta dos veces
+        records_filtered = (db.session.scalar(select(func.count()).select_from(filtered_stmt.subquery()))
+                            if searched else records_total)
+
+    page = filtered_stmt
+    if params['cursor'] is not None:
+        key = tuple_(sort_column, id_column)
+        value = tuple_(*params['cursor'])
+        page = page.where(key < value if params['descending'] else key > value)
+    elif params['start']:
+        page = page.offset(params['start'])
+
+    if params['descending']:
+        page = page.order_by(sort_column.desc(), id_column.desc())
+    else:
+        page = page.order_by(sort_column.asc(), id_column.asc())
+
+    rows = [dict(row._mapping) for row in db.session.execute(page.limit(params['length'] + 1))]
+    next_cursor = None
+    if len(rows) > params['length']:
+        rows = rows[:params['length']]
+        next_cursor = encode_cursor([rows[-1][params['order']], rows[-1]['id']])
+
+    return {
+        'draw': params['draw'],
+        'recordsTotal': records_total,
+        'recordsFiltered': records_filtered,
+        'data': rows,
+        'next_cursor': next_cursor,
+    }
+
+
+def _matching_persons(term):
+    # Personas con ese email o esa referencia, por igualdad sobre ix_person_email_lower / ix_person_reference_key
+    conditions = [func.lower(Person.email) == term.lower()]
+    key = normalize_reference(term)
+    if key is not None:
+        conditions.append(Person.reference_key == key)
+    return or_(*conditions)
+
+
+def numbers_page(params):
+    stmt = (
+        select(RaffleNumber.id, RaffleNumber.raffle_id, RaffleNumber.number, RaffleNumber.person_id,
+               Person.email, Person.first_name, Person.last_name, Person.address,
+               Person.reference_number, Person.confirmed, Raffle.max_number)
+        .join(Person, RaffleNumber.person_id == Person.id)
+        .join(Raffle, RaffleNumber.raffle_id == Raffle.id)
+    )
+    count_total = select(func.count(RaffleNumber.id))
+    filtered = stmt
+    if params['raffle_id']:
+        filtered = stmt.where(RaffleNumber.raffle_id == params['raffle_id'])
+        count_total = count_total.where(RaffleNumber.raffle_id == params['raffle_id'])
+
+    if params['search']:
+        term = params['search']
+        # Todas las condiciones sobre raffle_number: el planificador une los índices en vez de recorrer la tabla
+        conditions = [RaffleNumber.person_id.in_(select(Person.id).where(_matching_persons(term)))]
+        if term.isdigit():
+            conditions.append(RaffleNumber.number == int(term))
+        filtered = stmt.where(or_(*conditions))
+        if params['raffle_id']:
+            # "+ 0" para que no se use el índice del sorteo: sin estadísticas SQLite lo prefiere y
+            # recorre todos sus números, cuando la búsqueda ya deja unas pocas filas
+            filtered = filtered.where(RaffleNumber.raffle_id + 0 == params['raffle_id'])
+
+    page = paginate(filtered, NUMBER_COLUMNS, RaffleNumber.id, params, count_total, bool(params['search']))
+    # El cursor ya se calculó con el valor entero; el relleno es solo para mostrar
+    for row in page['data']:
+        row['number'] = format_number(row['number'], row.pop('max_number'))
+    return page
+
+
+def persons_page(params):
+    stmt = select(Person.id, Person.first_name, Person.last_name, Person.email,
+                  Person.reference_number, Person.confirmed)
+    count_total = select(func.count(Person.id))
+    if params['raffle_id']:
+        # IN sin correlación: el EXISTS por persona puede recorrer el índice (raffle_id, id) completo por cada fila
+        in_raffle = Person.id.in_(
+            select(RaffleNumber.person_id).where(RaffleNumber.raffle_id == params['raffle_id'])
+        )
+        stmt = stmt.where(in_raffle)
+        count_total = count_total.where(in_raffle)
+
+    filtered = stmt
+    if params['search']:
+        term = params['search']
+        conditions = [_matching_persons(term)]
+        if term.isdigit():
+            conditions.append(Person.id.in_(select(RaffleNumber.person_id).where(RaffleNumber.number == int(term))))
+        filtered = stmt.where(or_(*conditions))
+
+    page = paginate(filtered, PERSON_COLUMNS, Person.id, params, count_total, bool(params['search']))
+
+    # Números y nombre del sorteo de las personas de la página en una sola consulta
+    persons = {row['id']: row for row in page['data']}
+    for row in persons.values():
+        row['numbers'] = []
+        row['raffle_name'] = None
+    if persons:
+        numbers = db.session.execute(
+            select(RaffleNumber.person_id, RaffleNumber.number, Raffle.name, Raffle.max_number)
+            .join(Raffle, RaffleNumber.raffle_id == Raffle.id)
+            .where(RaffleNumber.person_id.in_(persons))
+            .order_by(RaffleNumber.person_id, RaffleNumber.number)
+        )
+        for person_id, number, raffle_name, max_number in numbers:
+            persons[person_id]['numbers'].append(format_number(number, max_number))
+            persons[person_id]['raffle_name'] = raffle_name
+    return page
+
+
+def raffles_with_counts():
+    # Cantidad de números vendidos por sorteo con un solo COUNT agrupado
+    counts = (
+        select(RaffleNumber.raffle_id, func.count(RaffleNumber.id).label('numbers_count'))
+        .group_by(RaffleNumber.raffle_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(Raffle, func.coalesce(counts.c.numbers_count, 0))
+        .outerjoin(counts, counts.c.raffle_id == Raffle.id)
+        .order_by(Raffle.id)
+    )
+    raffles = []
+    for raffle, numbers_count in rows:
+        raffle.numbers_count = numbers_count
+        raffles.append(raffle)
+    return raffles
+
+
+def person_with_numbers(person_id):
+    return db.first_or_404(
+        select(Person)
+        .where(Person.id == person_id)
+        .options(selectinload(Person.raffle_numbers).joinedload(RaffleNumber.raffle))
+    )
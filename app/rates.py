@@ -0,0 +1,185 @@
+"""Servicio de tasa de cambio con caché.
+
+La tasa vive en memoria de cada worker y en la tabla ``ExchangeRate`` que
+comparten todos. Antes de que expire se refresca en segundo plano (un solo
+worker reclama el refresco) y si la API falla se sigue sirviendo la última
+tasa conocida hasta ``RATE_MAX_STALE``.
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import or_, update
+
+from app import db
+from app.metrics import timed
+from app.models import ExchangeRate
+
+# Cada cuánto un worker vuelve a mirar la tabla, o a intentar reclamar el refresco, mientras otro refresca
+DB_CHECK_INTERVAL = 5
+# Tiempo tras el cual un refresco reclamado se considera abandonado
+CLAIM_TIMEOUT = 30
+
+
+class RateUnavailable(Exception):
+    pass
+
+
+class HttpRateProvider:
+    def __init__(self, url, currency, timeout):
+        self.url = url
+        self.currency = currency
+        self.timeout = timeout
+        self.session = None
+
+    def _session(self):
+        # requests se importa en la primera consulta, no al arrancar cada worker
+        if self.session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            self.session = session
+        return self.session
+
+    def fetch(self):
+        with timed('rifa_outbound_http_duration_seconds', target='exchange_rate'):
+            response = self._session().get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+        return float(response.json()['rates'][self.currency])
+
+
+class StaticRateProvider:
+    def __init__(self, rate):
+        self.rate = rate
+
+    def fetch(self):
+        return self.rate
+
+
+class RateService:
+    def __init__(self, provider, currency, ttl, refresh_ahead, max_stale):
+        self.provider = provider
+        self.currency = currency
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.max_stale = max_stale
+        self._entry = None  # (tasa, fetched_at)
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._claim_attempted_at = 0
+        self._fetch_lock = threading.Lock()
+        self._last_fetch = None  # (terminada_en, tasa, error) de la última consulta a la API
+
+    def get_rate(self):
+        now = time.time()
+        entry = self._entry
+        if entry is None or (now - entry[1] >= self.ttl - self.refresh_ahead
+                             and now - self._checked_at >= DB_CHECK_INTERVAL):
+            entry = self._load(now)
+
+        if entry is None or now - entry[1] > self.max_stale:
+            return self.refresh()
+
+        if now - entry[1] >= self.ttl - self.refresh_ahead:
+            self._refresh_in_background()
+        return entry[0]
+
+    def refresh(self):
+        # Una sola consulta a la vez por worker: las peticiones que llegan mientras tanto esperan
+        # y usan su resultado (o su error) en vez de repetirla
+        requested = time.time()
+        with self._fetch_lock:
+            if self._last_fetch is None or self._last_fetch[0] < requested:
+                self._last_fetch = self._fetch()
+            _, rate, error = self._last_fetch
+        if error is None:
+            return rate
+        if self._entry is not None and time.time() - self._entry[1] <= self.max_stale:
+            return self._entry[0]
+        raise RateUnavailable('Tasa de cambio no disponible.') from error
+
+    def _fetch(self):
+        try:
+            rate = self.provider.fetch()
+        except Exception as e:
+            current_app.logger.warning('No se pudo obtener la tasa de cambio: %s', e)
+            return time.time(), None, e
+        self._store(rate, time.time())
+        return time.time(), rate, None
+
+    def _load(self, now):
+        self._checked_at = now
+        stored = db.session.get(ExchangeRate, self.currency)
+        if stored is not None and (self._entry is None or stored.fetched_at > self._entry[1]):
+            self._entry = (stored.rate, stored.fetched_at)
+        return self._entry
+
+    def _store(self, rate, fetched_at):
+        self._entry = (rate, fetched_at)
+        stored = db.session.get(ExchangeRate, self.currency)
+        if stored is None:
+            stored = ExchangeRate(currency=self.currency)
+            db.session.add(stored)
+        stored.rate = rate
+        stored.fetched_at = fetched_at
+        stored.refresh_claimed_at = None
+        db.session.commit()
+
+    def _claim(self):
+        # Solo un worker a la vez consulta la API
+        now = time.time()
+        result = db.session.execute(
+            update(ExchangeRate)
+            .where(ExchangeRate.currency == self.currency,
+                   or_(ExchangeRate.refresh_claimed_at.is_(None),
+                       ExchangeRate.refresh_claimed_at < now - CLAIM_TIMEOUT))
+            .values(refresh_claimed_at=now)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _refresh_in_background(self):
+        # Mientras otro worker tiene el refresco reclamado se reintenta el reclamo a lo sumo cada
+        # DB_CHECK_INTERVAL: en SQLite cada intento es una escritura que compite con las compras
+        now = time.time()
+        with self._lock:
+            if self._refreshing or now - self._claim_attempted_at < DB_CHECK_INTERVAL:
+                return
+            self._refreshing = True
+            self._claim_attempted_at = now
+        app = current_app._get_current_object()
+        threading.Thread(target=self._refresh_job, args=(app,), daemon=True).start()
+
+    def _refresh_job(self, app):
+        try:
+            with app.app_context():
+                if self._claim():
+                    try:
+                        self.refresh()
+                    except RateUnavailable:
+                        pass
+                db.session.remove()
+        finally:
+            self._refreshing = False
+
+
+def init_rates(app):
+    if app.config['RATE_PROVIDER'] == 'static':
+        provider = StaticRateProvider(app.config['RATE_STATIC_VALUE'])
+    else:
+        provider = HttpRateProvider(app.config['API_URL'], app.config['RATE_CURRENCY'],
+                                    app.config['RATE_HTTP_TIMEOUT'])
+    app.extensions['rates'] = RateService(
+        provider,
+        app.config['RATE_CURRENCY'],
+        ttl=app.config['RATE_CACHE_TTL'],
+        refresh_ahead=app.config['RATE_REFRESH_AHEAD'],
+        max_stale=app.config['RATE_MAX_STALE'],
+    )
+
+
+def get_rate():
+    return current_app.extensions['rates'].get_rate()
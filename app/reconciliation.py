@@ -0,0 +1,172 @@
+"""Conciliación de pagos contra el estado de cuenta del banco.
+
+Se importa el CSV del banco, cada línea se normaliza con
+``normalize_reference`` y se busca en ``Person.reference_key`` (indexado) de
+los compradores del sorteo, en lotes. Cada línea queda clasificada:
+
+- ``matched``: un solo comprador y el monto coincide con
+  ``valor_numero × números comprados``; se puede confirmar.
+- ``amount_mismatch``: el monto no coincide.
+- ``amount_missing``: la celda del monto está vacía o no se entiende; sin
+  monto no se confirma el pago.
+- ``duplicate``: la referencia aparece en varias líneas del estado de cuenta o
+  la usaron varios compradores; se revisa a mano.
+- ``already_confirmed``: el comprador ya estaba confirmado.
+- ``unmatched``: ningún comprador con esa referencia.
+
+El estado de cuenta debe tener columna de monto. Las líneas sin referencia o
+con monto no positivo (débitos) se ignoran.
+Confirmar encola el correo de números de todos los compradores conciliados de
+una vez; quedan confirmados cuando el correo se entrega, como con
+``send_numbers``.
+"""
+import csv
+import io
+import re
+import unicodedata
+from collections import Counter, namedtuple
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.allocation import chunked
+from app.models import Person, RaffleNumber, normalize_reference
+
+StatementLine = namedtuple('StatementLine', 'line reference key amount')
+Match = namedtuple('Match', 'line reference amount status person_id name expected')
+
+STATUSES = ('matched', 'amount_mismatch', 'amount_missing', 'duplicate', 'already_confirmed', 'unmatched')
+
+# Nombres de columna (sin acentos, en minúsculas) que se reconocen en el encabezado
+REFERENCE_COLUMNS = ('referencia', 'reference', 'ref', 'nro. referencia', 'numero de referencia', 'nro referencia')
+AMOUNT_COLUMNS = ('monto', 'importe', 'amount', 'credito', 'abono', 'haber')
+
+
+class InvalidStatement(Exception):
+    pass
+
+
+def _plain(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return text.strip().lower()
+
+
+def _find_column(header, names):
+    plain = [_plain(column) for column in header]
+    for name in names:
+        if name in plain:
+            return plain.index(name)
+    for index, column in enumerate(plain):
+        if any(column.startswith(name) for name in names):
+            return index
+    return None
+
+
+def parse_amount(text):
+    # Acepta "1.234,56", "1,234.56", "1234,56", "1234.56" y "1.500" (miles)
+    text = re.sub(r'[^\d,.\-]', '', text or '')
+    if not text:
+        return None
+    separators = [position for position, char in enumerate(text) if char in ',.']
+    if separators:
+        last = separators[-1]
+        decimals = len(text) - last - 1
+        # El último separador es decimal si hay dos tipos distintos o si no le siguen exactamente 3 dígitos
+        is_decimal = len(set(text[i] for i in separators)) > 1 or (len(separators) == 1 and decimals != 3)
+        integer = re.sub(r'[,.]', '', text[:last] if is_decimal else text)
+        text = f'{integer}.{text[last + 1:]}' if is_decimal else integer
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+def read_statement(file):
+    limit = current_app.config['STATEMENT_MAX_BYTES']
+    data = file.stream.read(limit + 1)
+    if len(data) > limit:
+        raise InvalidStatement(f'El archivo no puede exceder los {limit // (1024 * 1024)} MB.')
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        text = data.decode('latin-1')
+    return parse_statement(text)
+
+
+def parse_statement(text):
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t|')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(text), dialect)
+    header = next(reader, None)
+    if not header:
+        raise InvalidStatement('El archivo está vacío.')
+
+    reference_index = _find_column(header, REFERENCE_COLUMNS)
+    if reference_index is None:
+        raise InvalidStatement('No se encontró la columna de referencia en el encabezado.')
+    amount_index = _find_column(header, AMOUNT_COLUMNS)
+    if amount_index is None:
+        raise InvalidStatement('No se encontró la columna de monto en el encabezado.')
+
+    lines = []
+    for line_number, row in enumerate(reader, 2):
+        if len(row) <= reference_index:
+            continue
+        reference = row[reference_index].strip()
+        amount = parse_amount(row[amount_index]) if len(row) > amount_index else None
+        key = normalize_reference(reference)
+        if key is None or (amount is not None and amount <= 0):
+            continue
+        lines.append(StatementLine(line_number, reference, key, amount))
+    return lines
+
+
+def _buyers(raffle_id, keys):
+    # referencia normalizada -> [(id, nombre, confirmado, cantidad de números)]
+    buyers = {}
+    for chunk in chunked(keys):
+        rows = db.session.execute(
+            select(Person.id, Person.reference_key, Person.first_name, Person.last_name, Person.confirmed,
+                   func.count(RaffleNumber.id))
+            .join(RaffleNumber, RaffleNumber.person_id == Person.id)
+            .where(RaffleNumber.raffle_id == raffle_id, Person.reference_key.in_(chunk))
+            .group_by(Person.id, Person.reference_key, Person.first_name, Person.last_name, Person.confirmed)
+        )
+        for person_id, key, first_name, last_name, confirmed, count in rows:
+            buyers.setdefault(key, []).append((person_id, f'{first_name} {last_name}', confirmed, count))
+    return buyers
+
+
+def reconcile(raffle, lines):
+    repeated = Counter(line.key for line in lines)
+    buyers = _buyers(raffle.id, list(repeated))
+
+    matches = []
+    for line in lines:
+        candidates = buyers.get(line.key, [])
+        if not candidates:
+            matches.append(Match(line.line, line.reference, line.amount, 'unmatched', None, None, None))
+            continue
+        person_id, name, confirmed, count = candidates[0]
+        expected = raffle.valor_numero * count
+        if repeated[line.key] > 1 or len(candidates) > 1:
+            status = 'duplicate'
+        elif confirmed:
+            status = 'already_confirmed'
+        elif line.amount is None:
+            status = 'amount_missing'
+        elif line.amount != expected:
+            status = 'amount_mismatch'
+        else:
+            status = 'matched'
+        matches.append(Match(line.line, line.reference, line.amount, status, person_id, name, expected))
+    return matches
+
+
+def summarize(matches):
+    counts = Counter(match.status for match in matches)
+    return {status: counts.get(status, 0) for status in STATUSES}
@@ -0,0 +1,92 @@
+"""Eliminación y archivo de personas y sorteos con sentencias por conjuntos.
+
+Los números, correos y posiciones del pool se eliminan en cascada desde la
+base de datos (``ON DELETE CASCADE``), así borrar personas o un sorteo no
+carga ningún objeto. Antes de borrar personas sus números vuelven al pool del
+sorteo. Archivar un sorteo copia el sorteo y sus números vendidos (con los
+datos del comprador) a ``archived_raffle`` / ``archived_raffle_number`` con
+``INSERT ... SELECT`` y luego lo elimina de las tablas principales.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, literal, select
+
+from app import db
+from app.allocation import chunked, release_numbers
+from app.models import ArchivedRaffle, ArchivedRaffleNumber, Draw, EmailMessage, Person, Raffle, RaffleNumber
+from app.purchases import lock_raffle
+
+
+def _purge_persons(condition):
+    # FOR UPDATE evita que el worker de correos confirme a alguien mientras se elimina (Postgres)
+    person_ids = db.session.scalars(select(Person.id).where(condition).with_for_update()).all()
+
+    released = {}
+    for chunk in chunked(person_ids):
+        rows = db.session.execute(
+            select(RaffleNumber.raffle_id, RaffleNumber.number).where(RaffleNumber.person_id.in_(chunk))
+        )
+        for raffle_id, number in rows:
+            released.setdefault(raffle_id, []).append(number)
+    for raffle_id in sorted(released):
+        release_numbers(lock_raffle(raffle_id), released[raffle_id])
+
+    for chunk in chunked(person_ids):
+        db.session.execute(delete(Person).where(Person.id.in_(chunk)),
+                           execution_options={'synchronize_session': False})
+    return len(person_ids), sorted(released)
+
+
+def purge_person(person_id):
+    # Devuelve (personas eliminadas, sorteos afectados)
+    return _purge_persons(Person.id == person_id)
+
+
+def purge_unconfirmed(hours, raffle_id=None):
+    # Personas sin confirmar creadas hace más de `hours` horas; las que tienen el correo
+    # de números en cola ya fueron aprobadas por un admin y se conservan, igual que las de sorteos
+    # con commit de ganadores, cuyos números vendidos quedaron fijos
+    locked = select(Draw.raffle_id).where(Draw.raffle_id.is_not(None))
+    pending = select(EmailMessage.person_id).where(EmailMessage.kind == 'numbers',
+                                                   EmailMessage.status.in_(['pending', 'sending']),
+                                                   EmailMessage.person_id.is_not(None))
+    condition = (Person.confirmed.is_not(True)
+                 & (Person.created_at < datetime.utcnow() - timedelta(hours=hours))
+                 & Person.id.not_in(pending)
+                 & ~Person.raffle_numbers.any(RaffleNumber.raffle_id.in_(locked)))
+    if raffle_id is not None:
+        condition &= Person.raffle_numbers.any(RaffleNumber.raffle_id == raffle_id)
+    return _purge_persons(condition)
+
+
+def purge_raffle(raffle_id):
+    # Las personas del sorteo (y en cascada sus números y correos), luego el sorteo y su pool
+    persons = select(RaffleNumber.person_id).where(RaffleNumber.raffle_id == raffle_id)
+    db.session.execute(
+        delete(Person).where(Person.id.in_(persons),
+                             ~Person.raffle_numbers.any(RaffleNumber.raffle_id != raffle_id)),
+        execution_options={'synchronize_session': False},
+    )
+    result = db.session.execute(delete(Raffle).where(Raffle.id == raffle_id),
+                                execution_options={'synchronize_session': False})
+    return result.rowcount
+
+
+def archive_and_purge_raffle(raffle):
+    archived = ArchivedRaffle(raffle_id=raffle.id, name=raffle.name, start_date=raffle.start_date,
+                              max_number=raffle.max_number, valor_numero=raffle.valor_numero,
+                              image_filename=raffle.image_filename)
+    db.session.add(archived)
+    db.session.flush()
+
+    columns = ['archived_raffle_id', 'number', 'first_name', 'last_name', 'address', 'reference_number',
+               'email', 'confirmed', 'created_at']
+    sold = (
+        select(literal(archived.id), RaffleNumber.number, Person.first_name, Person.last_name, Person.address,
+               Person.reference_number, Person.email, Person.confirmed, Person.created_at)
+        .join(Person, RaffleNumber.person_id == Person.id)
+        .where(RaffleNumber.raffle_id == raffle.id)
+    )
+    count = db.session.execute(insert(ArchivedRaffleNumber).from_select(columns, sold)).rowcount
+    purge_raffle(raffle.id)
+    return archived, count
@@ -3,11 +3,11 @@ from flask import Blueprint, render_template, redirect, url_for, flash
 from app import db, bcrypt
 from flask_login import login_user, logout_user, login_required
 from sqlalchemy.exc import IntegrityError
-from flask import send_from_directory
 
 # propios
 from app.forms import RegisterForm, LoginForm
 from app.models import User
+from app.assets import send_cached, media_max_age
 from config import Config
 
 
@@ -69,4 +69,5 @@ def logout():
 
 @auth_bp.route('/media/images/<filename>')
 def media_images(filename):
-    return send_from_directory(Config.UPLOAD_FOLDER, filename)
\ No newline at end of file
+    max_age, immutable = media_max_age(filename)
+    return send_cached(Config.UPLOAD_FOLDER, filename, max_age, immutable=immutable)
\ No newline at end of file
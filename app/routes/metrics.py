@@ -0,0 +1,62 @@
+import hmac
+import os
+
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session, current_app, abort
+from flask_login import login_required, current_user
+
+from app.metrics import registry, collect, render, list_profiles, profiles_directory
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def _metrics_authorized():
+    # Prometheus se autentica con METRICS_TOKEN; sin token configurado solo un administrador con sesión
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        header = request.headers.get('Authorization', '')
+        return hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+    return current_user.is_authenticated
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    if not _metrics_authorized():
+        response = current_app.response_class('No autorizado.\n', status=401, mimetype='text/plain')
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response
+    # Este worker vuelca lo último antes de sumar los archivos de todos
+    registry.flush(force=True)
+    text = render(*collect(registry.directory))
+    response = current_app.response_class(text, mimetype='text/plain; version=0.0.4')
+    response.cache_control.no_store = True
+    return response
+
+
+@metrics_bp.route('/profiler', methods=['GET'])
+@login_required
+def profiler():
+    return render_template('profiler.html', enabled=session.get('profiler', False), profiles=list_profiles(),
+                           current_page='profiler')
+
+
+@metrics_bp.route('/profiler/toggle', methods=['POST'])
+@login_required
+def toggle_profiler():
+    session['profiler'] = not session.get('profiler', False)
+    if session['profiler']:
+        flash('Perfilador activado: tus próximas peticiones quedarán registradas.', 'success')
+    else:
+        flash('Perfilador desactivado.', 'success')
+    return redirect(url_for('metrics.profiler'))
+
+
+@metrics_bp.route('/profiler/<name>')
+@login_required
+def profile_detail(name):
+    if name not in list_profiles():
+        abort(404)
+    with open(os.path.join(profiles_directory(), name)) as fp:
+        report = fp.read()
+    return render_template('profiler.html', enabled=session.get('profiler', False), profiles=list_profiles(),
+                           selected=name, report=report, current_page='profiler')
@@ -1,10 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, request, current_app, stream_with_context
 from flask_login import login_required
-from flask_mail import Message
-from app import mail
-from app import db
-from app.models import RaffleNumber
-from app.models import Person
+from app import db, csrf
+from app.models import Raffle, RaffleNumber
+from app.forms import AssignBlockForm, ReconcileForm, ConfirmMatchesForm
+from app.allocation import release_numbers, NotEnoughNumbers
+from app.purchases import lock_raffle, purchase_numbers, PurchaseFailed
+from app.retention import purge_person, purge_unconfirmed
+from app.exports import export_stream, FORMATS
+from app.reconciliation import read_statement, reconcile, summarize, InvalidStatement
+from app.cache import raffle_cache
+from app.events import raffle_events
+from app.mailer import enqueue_numbers_email, enqueue_raffle_numbers
+from app.queries import page_params, numbers_page, persons_page, person_with_numbers, NUMBER_COLUMNS, PERSON_COLUMNS
 
 number_bp = Blueprint('number', __name__)
 
@@ -12,17 +19,32 @@ number_bp = Blueprint('number', __name__)
 @number_bp.route('/list_numbers')
 @login_required
 def list_numbers():
-    numeros = RaffleNumber.query.all()
-    return render_template('list_numbers.html', numeros=numeros, current_page='list_numbers')
+    raffle_id = request.args.get('raffle_id', type=int)
+    return render_template('list_numbers.html', raffle_id=raffle_id, current_page='list_numbers')
+
+
+@number_bp.route('/api/numbers')
+@login_required
+def api_numbers():
+    return jsonify(numbers_page(page_params(NUMBER_COLUMNS)))
 
 
 @number_bp.route('/delete_number/<int:raffle_number_id>', methods=['POST'])
 @login_required
 def delete_number(raffle_number_id):
+    raffle_id = RaffleNumber.query.get_or_404(raffle_number_id).raffle_id
     try:
-        number = RaffleNumber.query.get_or_404(raffle_number_id)
+        # El pool se lee después de tomar el bloqueo del sorteo, igual que en una compra
+        raffle = lock_raffle(raffle_id)
+        number = db.session.get(RaffleNumber, raffle_number_id, populate_existing=True)
+        if number is None:
+            db.session.rollback()
+            flash('El número ya no existe.', 'error')
+            return redirect(url_for('number.list_numbers'))
+        release_numbers(raffle, [number.number])
         db.session.delete(number)
         db.session.commit()
+        raffle_cache().invalidate_remaining(raffle_id)
         flash('Número eliminado exitosamente.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -33,51 +55,209 @@ def delete_number(raffle_number_id):
 @number_bp.route('/list_person')
 @login_required
 def list_person():
-    persons = Person.query.all()
-    return render_template('list_person.html', persons=persons, current_page='list_person')
+    raffle_id = request.args.get('raffle_id', type=int)
+    return render_template('list_person.html', raffle_id=raffle_id, current_page='list_person')
+
+
+@number_bp.route('/api/persons')
+@login_required
+def api_persons():
+    return jsonify(persons_page(page_params(PERSON_COLUMNS)))
 
 
 @number_bp.route('/delete_person/<int:person_id>', methods=['POST'])
 @login_required
 def delete_person(person_id):
     try:
-        person = Person.query.get_or_404(person_id)
-        for number in person.raffle_numbers:
-            db.session.delete(number)
-        db.session.delete(person)
+        deleted, raffle_ids = purge_person(person_id)
         db.session.commit()
-        flash('Persona eliminada exitosamente.', 'success')
+        for raffle_id in raffle_ids:
+            raffle_cache().invalidate_remaining(raffle_id)
+        if deleted:
+            flash('Persona eliminada exitosamente.', 'success')
+        else:
+            flash('La persona no existe.', 'error')
     except Exception as e:
         db.session.rollback()
-        print(e)
         flash(f'Hubo un problema al eliminar la persona. {e}', 'error')
     return redirect(url_for('number.list_person'))
 
 
+@number_bp.route('/purge_unconfirmed', methods=['POST'])
+@login_required
+def purge_unconfirmed_persons():
+    hours = request.form.get('hours', type=int)
+    raffle_id = request.form.get('raffle_id', type=int)
+    if hours is None or hours < 1:
+        flash('Indica una cantidad de horas válida.', 'error')
+        return redirect(url_for('number.list_person', raffle_id=raffle_id))
+    try:
+        deleted, raffle_ids = purge_unconfirmed(hours, raffle_id)
+        db.session.commit()
+        for affected in raffle_ids:
+            raffle_cache().invalidate_remaining(affected)
+        flash(f'{deleted} personas sin confirmar eliminadas.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Hubo un problema al eliminar las personas. {e}', 'error')
+    return redirect(url_for('number.list_person', raffle_id=raffle_id))
+
+
 @number_bp.route('/send_numbers/<int:person_id>', methods=['POST'])
 @login_required
 def send_numbers(person_id):
     try:
-        person = Person.query.get_or_404(person_id)
-        numbers = [number.number for number in person.raffle_numbers]
-        msg = Message('Tus números de la rifa', recipients=[person.email])
-        msg.html = (f'<html>'
-                    f'<body style="font-family: Arial, sans-serif; color: #333; background-color: #f4f4f9;">'
-                    f'<h2 style="color: #3498db;">¡Hola!</h2>'
-                    f'<p><strong>Tus números de la rifa son:</strong></p>'
-                    f'<p style="font-size: 16px;">{", ".join(map(str, numbers))}</p>'
-                    f'<hr style="border: 1px solid #ddd;">'
-                    f'<p>¡Gracias por participar!</p>'
-                    f'<p>El equipo de Poison G</p>'
-                    f'</body>'
-                    f'</html>')
-
-        mail.send(msg)
-        person.confirmed = True
-        db.session.add(person)
-        db.session.commit()
-        flash('Correo enviado exitosamente.', 'success')
+        person = person_with_numbers(person_id)
+        if enqueue_numbers_email(person):
+            db.session.commit()
+            flash('Correo en cola de envío. La persona quedará confirmada cuando se entregue.', 'success')
+        else:
+            flash('Esta persona ya está confirmada o tiene un correo pendiente.', 'info')
     except Exception as e:
         db.session.rollback()
         flash(f'Hubo un problema al enviar el correo. {e}', 'error')
-    return redirect(url_for('number.list_person'))
\ No newline at end of file
+    return redirect(url_for('number.list_person'))
+
+
+@number_bp.route('/send_raffle_numbers/<int:raffle_id>', methods=['POST'])
+@login_required
+def send_raffle_numbers(raffle_id):
+    try:
+        count = enqueue_raffle_numbers(raffle_id)
+        db.session.commit()
+        flash(f'{count} correos en cola de envío.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Hubo un problema al encolar los correos. {e}', 'error')
+    return redirect(url_for('raffle.list_raffles'))
+
+
+def _block_form(**kwargs):
+    form = AssignBlockForm(**kwargs)
+    form.raffle_id.choices = [(raffle.id, raffle.name) for raffle in Raffle.query.order_by(Raffle.id.desc())]
+    return form
+
+
+def _assign_block(form):
+    # Devuelve (persona, números) o lanza NotEnoughNumbers / PurchaseFailed / ValueError
+    limit = current_app.config['BULK_PURCHASE_MAX_NUMBERS']
+    if form.count.data > limit:
+        raise ValueError(f'No puedes asignar más de {limit} números en un bloque.')
+    person, numbers = purchase_numbers(
+        form.raffle_id.data, form.count.data, send_numbers=form.send_numbers.data,
+        first_name=form.first_name.data, last_name=form.last_name.data, address=form.address.data,
+        reference_number=form.reference_number.data, email=form.email.data,
+    )
+    raffle_cache().invalidate_remaining(form.raffle_id.data)
+    raffle_events().notify(form.raffle_id.data)
+    return person, numbers
+
+
+@number_bp.route('/assign_block', methods=['GET', 'POST'])
+@login_required
+def assign_block():
+    form = _block_form()
+    if form.validate_on_submit():
+        try:
+            person, numbers = _assign_block(form)
+            flash(f'Se asignaron {len(numbers)} números a {person.first_name} {person.last_name}.', 'success')
+            return redirect(url_for('number.list_numbers', raffle_id=form.raffle_id.data))
+        except (NotEnoughNumbers, PurchaseFailed, ValueError) as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                flash(f'{field}: {error}', 'error')
+    return render_template('assign_block.html', form=form, current_page='assign_block')
+
+
+@number_bp.route('/api/purchases', methods=['POST'])
+@csrf.exempt
+@login_required
+def api_purchases():
+    # Solo JSON: un formulario de otro sitio no puede enviar application/json sin CORS
+    if not request.is_json:
+        return jsonify(error='Se esperaba un cuerpo JSON.'), 415
+    form = _block_form(meta={'csrf': False})
+    if not form.validate():
+        return jsonify(errors=form.errors), 400
+    try:
+        person, numbers = _assign_block(form)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except NotEnoughNumbers as e:
+        db.session.rollback()
+        return jsonify(error=str(e), available=e.available), 409
+    except PurchaseFailed as e:
+        return jsonify(error=str(e)), 503
+    raffle = db.session.get(Raffle, form.raffle_id.data)
+    return jsonify(person_id=person.id, numbers=[raffle.format_number(number) for number in sorted(numbers)]), 201
+
+
+@number_bp.route('/export/<any(numbers, persons):kind>.<any(csv, xlsx):fmt>')
+@login_required
+def export(kind, fmt):
+    raffle_id = request.args.get('raffle_id', type=int)
+    confirmed = {'yes': True, 'no': False}.get(request.args.get('confirmed'))
+    filename = f'{kind}-{raffle_id or "todos"}.{fmt}'
+    stream = export_stream(kind, fmt, raffle_id, confirmed)
+    response = current_app.response_class(stream_with_context(stream), content_type=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.cache_control.no_store = True
+    return response
+
+
+# Líneas con problemas que se muestran por estado; el resumen siempre cuenta todas
+RECONCILE_DISPLAY_LIMIT = 500
+
+
+@number_bp.route('/reconcile', methods=['GET', 'POST'])
+@login_required
+def reconcile_statement():
+    form = ReconcileForm()
+    raffles = Raffle.query.order_by(Raffle.active.desc(), Raffle.id.desc()).all()
+    form.raffle_id.choices = [(raffle.id, raffle.name) for raffle in raffles]
+    result = None
+    if form.validate_on_submit():
+        raffle = db.session.get(Raffle, form.raffle_id.data)
+        try:
+            matches = reconcile(raffle, read_statement(form.statement.data))
+        except InvalidStatement as e:
+            flash(str(e), 'error')
+        else:
+            matched = [match.person_id for match in matches if match.status == 'matched']
+            issues = {}
+            for match in matches:
+                if match.status != 'matched' and len(issues.setdefault(match.status, [])) < RECONCILE_DISPLAY_LIMIT:
+                    issues[match.status].append(match)
+            confirm_form = ConfirmMatchesForm(raffle_id=raffle.id, person_ids=','.join(map(str, matched)))
+            result = {'raffle': raffle, 'summary': summarize(matches), 'lines': len(matches), 'issues': issues,
+                      'confirm_form': confirm_form}
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                flash(f'{field}: {error}', 'error')
+    return render_template('reconcile.html', form=form, result=result, display_limit=RECONCILE_DISPLAY_LIMIT,
+                           current_page='reconcile')
+
+
+@number_bp.route('/reconcile/confirm', methods=['POST'])
+@login_required
+def confirm_reconciled():
+    form = ConfirmMatchesForm()
+    if not form.validate_on_submit():
+        flash('No hay compradores conciliados para confirmar.', 'error')
+        return redirect(url_for('number.reconcile_statement'))
+    try:
+        person_ids = [int(person_id) for person_id in form.person_ids.data.split(',') if person_id]
+        count = enqueue_raffle_numbers(int(form.raffle_id.data), person_ids)
+        db.session.commit()
+        flash(f'{count} compradores conciliados. Quedarán confirmados cuando se entregue su correo.', 'success')
+    except ValueError:
+        flash('La lista de compradores no es válida.', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Hubo un problema al confirmar los pagos. {e}', 'error')
+    return redirect(url_for('number.list_person', raffle_id=form.raffle_id.data))
@@ -1,27 +1,55 @@
 # Flask
-from flask import Blueprint, render_template, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, request, make_response, current_app, abort
 from flask_login import login_required
-import random
-import requests
-from werkzeug.utils import secure_filename
-import os
 
 # propios
 from app import db
-from app.models import Raffle, RaffleNumber, Person
-from app.forms import RaffleForm, CreateRaffleForm, EditRaffleForm
+from app.models import Raffle, Draw, slugify
+from app.forms import RaffleForm, CreateRaffleForm, EditRaffleForm, CommitDrawForm, RevealDrawForm
 from config import Config
-from app.utils import allowed_file, MAX_CONTENT_LENGTH
+from app.images import save_raffle_image, variant_filename, InvalidImage
+from app.allocation import resize_pool, NotEnoughNumbers
+from app.purchases import lock_raffle, purchase_numbers, PurchaseFailed
+from app.rates import get_rate, RateUnavailable
+from app.queries import raffles_with_counts
+from app.retention import purge_raffle, archive_and_purge_raffle
+from app.cache import raffle_cache, page_etag, is_cacheable_request
+from app.events import raffle_events, event_stream, TooManyClients
+from app.draws import commit_draw, reveal_draw, draw_result, sold_numbers_bitmap, DrawError
+from app.limits import limiter, configured, purchase_limits
 
 
 raffle_bp = Blueprint('raffle', __name__)
 
 
 @raffle_bp.route('/', methods=['GET', 'POST'])
+@purchase_limits
 def index():
+    # Con un solo sorteo activo la portada es su página de compra; con varios, la lista de sorteos
+    raffles = raffle_cache().active_raffles()
+    if len(raffles) <= 1:
+        return _purchase_page(next(iter(raffles.values()), None))
+    if request.method == 'POST':
+        flash('Elige el sorteo en el que quieres participar.', 'error')
+        return redirect(url_for('raffle.index'))
+    return _cached_page('raffles.html', raffles=list(raffles.values()))
+
+
+@raffle_bp.route('/raffle/<slug>', methods=['GET', 'POST'])
+@purchase_limits
+def raffle_page(slug):
+    raffle = raffle_cache().active_raffle(slug)
+    if raffle is None and request.method == 'GET':
+        # Enlace a un sorteo cerrado o inexistente
+        return render_template('index.html', form=RaffleForm(), raffle=None, closed=True, current_page='index'), 404
+    return _purchase_page(raffle)
+
+
+def _purchase_page(raffle):
     form = RaffleForm()
-    # Obtener la rifa activa
-    raffle = Raffle.query.filter_by(active=True).first()
+    cache = raffle_cache()
+    # Después de comprar se vuelve a la misma página (la portada o la del sorteo)
+    page = url_for(request.endpoint, **request.view_args)
     if form.validate_on_submit():
         email = form.email.data
         num_numbers = form.num_numbers.data
@@ -37,11 +65,20 @@ def index():
 
         if not raffle:
             flash('No hay sorteos activos en este momento.', 'error')
-            return redirect(url_for('raffle.index'))
+            return redirect(page)
 
         if num_numbers > raffle.max_number:
             flash(f'No puedes solicitar más de {raffle.max_number} números para este sorteo.', 'error')
-            return redirect(url_for('raffle.index'))
+            return redirect(page)
+
+        # Rechazo rápido sin tocar la base de datos; la reserva vuelve a validar
+        remaining = cache.remaining(raffle.id)
+        if remaining == 0:
+            flash('No hay números disponibles en este momento.', 'error')
+            return redirect(page)
+        elif remaining is not None and num_numbers > remaining:
+            flash(f'Solo quedan {remaining} números disponibles.', 'error')
+            return redirect(page)
 
         first_name = form.first_name.data
         last_name = form.last_name.data
@@ -49,41 +86,31 @@ def index():
         reference_number = form.reference_number.data
         bank_account = form.bank_account.data
 
-        # Obtener los números ya utilizados en la rifa activa
-        used_numbers = [number.number for number in RaffleNumber.query.filter_by(raffle_id=raffle.id).all()]
-        available_numbers = [str(num).zfill(len(str(raffle.max_number))) for num in range(1, raffle.max_number + 1) if
-                             str(num).zfill(len(str(raffle.max_number))) not in used_numbers]
-
-        if len(available_numbers) == 0:
-            flash('No hay números disponibles en este momento.', 'error')
-            return redirect(url_for('raffle.index'))
-        elif len(available_numbers) < num_numbers:
-            flash(f'Solo quedan {len(available_numbers)} números disponibles.', 'error')
-            return redirect(url_for('raffle.index'))
-
         try:
-            person = Person(first_name=first_name, last_name=last_name, address=address,
-                            reference_number=reference_number, email=email)
-            db.session.add(person)
-            db.session.commit()
-
-            # Generar los números de la rifa
-            numbers = random.sample(available_numbers, num_numbers)
+            # Reservar los números y registrar a la persona en una sola transacción
+            purchase_numbers(raffle.id, num_numbers, first_name=first_name, last_name=last_name,
+                             address=address, reference_number=reference_number, email=email)
 
-            for number in numbers:
-                new_number = RaffleNumber(number=number, person_id=person.id, raffle_id=raffle.id)
-                db.session.add(new_number)
+            mensaje = 'Tus números de la rifa han sido enviados a tu correo electrónico regitrado. ¡Buena suerte!', 'success'
 
-            db.session.commit()
+        except NotEnoughNumbers as e:
+            db.session.rollback()
+            if e.available == 0:
+                mensaje = 'No hay números disponibles en este momento.', 'error'
+            else:
+                mensaje = str(e), 'error'
 
-            mensaje = 'Tus números de la rifa han sido enviados a tu correo electrónico regitrado. ¡Buena suerte!', 'success'
+        except PurchaseFailed as e:
+            mensaje = str(e), 'error'
 
         except Exception as e:
             db.session.rollback()
             mensaje = f'Hubo un problema al procesar tu solicitud. {e}', 'error'
 
+        cache.invalidate_remaining(raffle.id)
+        raffle_events().notify(raffle.id)
         flash(mensaje[0], mensaje[1])
-        return redirect(url_for('raffle.index'))
+        return redirect(page)
 
     else:
         if form.errors:
@@ -91,16 +118,53 @@ def index():
                 for error in errors:
                     flash(f'{field}: {error}', 'error')
 
-    return render_template('index.html', form=form, raffle=raffle, current_page='index')
+    return _cached_page('index.html', form=form, raffle=raffle)
+
+
+def _cached_page(template, raffle=None, **context):
+    etag = None
+    if is_cacheable_request():
+        etag = page_etag(raffle)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+    response = make_response(render_template(template, raffle=raffle, current_page='index', **context))
+    if etag:
+        response.set_etag(etag)
+        response.last_modified = raffle_cache().last_modified()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+@raffle_bp.route('/raffle/<slug>/events')
+def events(slug):
+    # Números restantes del sorteo en vivo (text/event-stream)
+    raffle = raffle_cache().active_raffle(slug)
+    if raffle is None:
+        abort(404)
+    config = current_app.config
+    try:
+        client = raffle_events().subscribe(raffle.id)
+    except TooManyClients:
+        response = current_app.response_class(status=503)
+        response.retry_after = 30
+        return response
+    stream = event_stream(raffle_events(), raffle.id, client, config['SSE_KEEPALIVE'], config['SSE_MAX_DURATION'],
+                          config['SSE_RETRY_MS'])
+    response = current_app.response_class(stream, mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx no debe acumular el stream
+    return response
 
 
 @raffle_bp.route('/list_raffles', methods=['GET'])
 @login_required
 def list_raffles():
-    raffles = Raffle.query.all()
-    # ver numeros generados cantidad
-    for raffle in raffles:
-        raffle.numbers_count = len(raffle.raffle_numbers)
+    raffles = raffles_with_counts()
     return render_template('list_raffles.html', raffles=raffles, current_page='list_raffles')
 
 
@@ -109,42 +173,33 @@ def list_raffles():
 def create_raffle():
     form = CreateRaffleForm()
     if form.validate_on_submit():
+        slug = form.slug.data or slugify(form.name.data)
+        if _slug_taken(slug):
+            flash(f'Ya hay un sorteo con la dirección /raffle/{slug}; elige otra.', 'error')
+            return render_template('create_raffle.html', form=form, current_page='create_raffle')
         if form.image.data:
-            file = form.image.data
-
-            # Validar el tamaño del archivo
-            if len(file.read()) > MAX_CONTENT_LENGTH:
-                flash('El tamaño de la imagen no puede exceder los 2 MB.', 'error')
-                return redirect(url_for('raffle.create_raffle'))
-
-            file.seek(0)
-
-            # Validar la extensión del archivo
-            if not allowed_file(file.filename):
-                flash('Solo se permiten archivos de imagen (png, jpg, jpeg, gif).', 'error')
+            try:
+                image_hash = save_raffle_image(form.image.data, Config.UPLOAD_FOLDER)
+            except InvalidImage as e:
+                flash(str(e), 'error')
                 return redirect(url_for('raffle.create_raffle'))
 
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-            file.save(file_path)
-
             try:
                 new_raffle = Raffle(
                     name=form.name.data,
+                    slug=slug,
                     start_date=form.start_date.data,
                     max_number=form.max_number.data,
                     valor_numero=form.valor_numero.data,
-                    image_filename=filename
+                    image_filename=variant_filename(image_hash, 'desktop', 'jpg'),
+                    image_hash=image_hash,
+                    available_count=form.max_number.data
                 )
-                raffle = Raffle.query.filter_by(active=True).first()
-                if raffle:
-                    mensaje = f'Ya hay un sorteo activo llamado {raffle.name}.', 'info'
-                    raffle.active = False
-                    db.session.add(raffle)
-                else:
-                    mensaje = 'Sorteo creado exitosamente.', 'success'
+                # Varios sorteos pueden estar activos a la vez, cada uno en su dirección
                 db.session.add(new_raffle)
                 db.session.commit()
+                raffle_cache().invalidate()
+                mensaje = 'Sorteo creado exitosamente.', 'success'
             except Exception as e:
                 db.session.rollback()
                 mensaje = f'Hubo un problema al procesar tu solicitud. {e}', 'error'
@@ -154,14 +209,23 @@ def create_raffle():
     return render_template('create_raffle.html', form=form, current_page='create_raffle')
 
 
+def _slug_taken(slug, raffle_id=None):
+    other = db.session.scalar(db.select(Raffle.id).filter_by(slug=slug))
+    return other is not None and other != raffle_id
+
+
 @raffle_bp.route('/toggle_raffle/<int:raffle_id>', methods=['POST'])
 @login_required
 def toggle_raffle(raffle_id):
     # Obtener el sorteo especificado
     raffle = Raffle.query.get_or_404(raffle_id)
+    if not raffle.active and raffle.draw is not None:
+        flash('Este sorteo ya tiene el commit de ganadores publicado; no se puede volver a activar.', 'error')
+        return redirect(url_for('raffle.list_raffles'))
     raffle.active = not raffle.active
     db.session.add(raffle)
     db.session.commit()
+    raffle_cache().invalidate()
     flash(f'El sorteo {raffle.name} ha sido {"activado" if raffle.active else "desactivado"} exitosamente.', 'success')
     return redirect(url_for('raffle.list_raffles'))
 
@@ -173,32 +237,37 @@ def edit_raffle(raffle_id):
     form = EditRaffleForm(obj=raffle)
 
     if form.validate_on_submit():
+        if raffle.draw is not None and form.max_number.data != raffle.max_number:
+            flash('Los números de este sorteo quedaron fijos al publicar el commit de ganadores.', 'error')
+            return render_template('edit_raffle.html', form=form, raffle=raffle, current_page='edit_raffle')
+        slug = form.slug.data or raffle.slug
+        if _slug_taken(slug, raffle.id):
+            flash(f'Ya hay un sorteo con la dirección /raffle/{slug}; elige otra.', 'error')
+            return render_template('edit_raffle.html', form=form, raffle=raffle, current_page='edit_raffle')
+
+        image_hash = None
+        if form.image.data:
+            try:
+                image_hash = save_raffle_image(form.image.data, Config.UPLOAD_FOLDER)
+            except InvalidImage as e:
+                flash(str(e), 'error')
+                return redirect(url_for('raffle.edit_raffle', raffle_id=raffle_id))
 
+        # El pool se modifica con el sorteo bloqueado, igual que en una compra; la imagen
+        # se procesa antes para no retener el bloqueo mientras tanto
+        raffle = lock_raffle(raffle_id)
+        old_max_number = raffle.max_number
         raffle.name = form.name.data
+        raffle.slug = slug
         raffle.start_date = form.start_date.data
         raffle.max_number = form.max_number.data
         raffle.valor_numero = form.valor_numero.data
-
-        if form.image.data:
-            file = form.image.data
-
-            # Validar el tamaño del archivo
-            if len(file.read()) > MAX_CONTENT_LENGTH:
-                flash('El tamaño de la imagen no puede exceder los 2 MB.', 'error')
-                return redirect(url_for('raffle.edit_raffle', raffle_id=raffle_id))
-
-            file.seek(0)
-
-            # Validar la extensión del archivo
-            if not allowed_file(file.filename):
-                flash('Solo se permiten archivos de imagen (png, jpg, jpeg, gif).', 'error')
-                return redirect(url_for('raffle.edit_raffle', raffle_id=raffle_id))
-
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-            file.save(file_path)
-            raffle.image_filename = filename
+        if image_hash is not None:
+            raffle.image_hash = image_hash
+            raffle.image_filename = variant_filename(image_hash, 'desktop', 'jpg')
+        resize_pool(raffle, old_max_number)
         db.session.commit()
+        raffle_cache().invalidate()
         flash('Sorteo actualizado exitosamente.', 'success')
         return redirect(url_for('raffle.list_raffles'))
 
@@ -212,8 +281,115 @@ def admin():
 
 
 @raffle_bp.route('/conversion_rate')
+@limiter.limit(configured('RATELIMIT_CONVERSION_RATE'))
 def conversion_rate():
-    response = requests.get(Config.API_URL)
-    data = response.json()
-    rate = data['rates']['VES']
-    return jsonify({'exchange_rate': rate})
\ No newline at end of file
+    try:
+        rate = get_rate()
+    except RateUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    response = jsonify({'exchange_rate': rate})
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
+
+
+@raffle_bp.route('/delete_raffle/<int:raffle_id>', methods=['POST'])
+@login_required
+def delete_raffle(raffle_id):
+    raffle = Raffle.query.get_or_404(raffle_id)
+    name = raffle.name
+    try:
+        purge_raffle(raffle_id)
+        db.session.commit()
+        raffle_cache().invalidate()
+        flash(f'El sorteo {name} y todos sus números fueron eliminados.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Hubo un problema al eliminar el sorteo. {e}', 'error')
+    return redirect(url_for('raffle.list_raffles'))
+
+
+@raffle_bp.route('/archive_raffle/<int:raffle_id>', methods=['POST'])
+@login_required
+def archive_raffle(raffle_id):
+    raffle = Raffle.query.get_or_404(raffle_id)
+    if raffle.active:
+        flash('Desactiva el sorteo antes de archivarlo.', 'error')
+        return redirect(url_for('raffle.list_raffles'))
+    name = raffle.name
+    try:
+        _, count = archive_and_purge_raffle(raffle)
+        db.session.commit()
+        raffle_cache().invalidate()
+        flash(f'El sorteo {name} fue archivado con {count} números vendidos.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Hubo un problema al archivar el sorteo. {e}', 'error')
+    return redirect(url_for('raffle.list_raffles'))
+
+
+@raffle_bp.route('/draw/<int:raffle_id>', methods=['GET'])
+@login_required
+def raffle_draw(raffle_id):
+    raffle = Raffle.query.get_or_404(raffle_id)
+    return render_template('draw.html', raffle=raffle, draw=raffle.draw, commit_form=CommitDrawForm(),
+                           reveal_form=RevealDrawForm(), current_page='list_raffles')
+
+
+@raffle_bp.route('/draw/<int:raffle_id>/commit', methods=['POST'])
+@login_required
+def commit_raffle_draw(raffle_id):
+    raffle = Raffle.query.get_or_404(raffle_id)
+    form = CommitDrawForm()
+    if form.validate_on_submit():
+        try:
+            commit_draw(raffle, form.prizes.data.splitlines(), form.entropy_source.data)
+            db.session.commit()
+            flash('Commit publicado. Comparte el enlace público antes de que se conozca la fuente de entropía.',
+                  'success')
+        except DrawError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Hubo un problema al publicar el commit. {e}', 'error')
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                flash(f'{field}: {error}', 'error')
+    return redirect(url_for('raffle.raffle_draw', raffle_id=raffle_id))
+
+
+@raffle_bp.route('/draw/<int:raffle_id>/reveal', methods=['POST'])
+@login_required
+def reveal_raffle_draw(raffle_id):
+    raffle = Raffle.query.get_or_404(raffle_id)
+    form = RevealDrawForm()
+    if raffle.draw is None or not form.validate_on_submit():
+        flash('Publica el commit antes de revelar los ganadores.', 'error')
+        return redirect(url_for('raffle.raffle_draw', raffle_id=raffle_id))
+    try:
+        draw = reveal_draw(raffle.draw, form.entropy.data)
+        db.session.commit()
+        flash(f'Ganadores revelados entre {draw.sold_count} números vendidos.', 'success')
+    except DrawError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Hubo un problema al revelar los ganadores. {e}', 'error')
+    return redirect(url_for('raffle.raffle_draw', raffle_id=raffle_id))
+
+
+@raffle_bp.route('/draws/<int:draw_id>')
+def draw_detail(draw_id):
+    # Página pública: el hash de la semilla desde el commit y el resultado verificable después
+    draw = Draw.query.get_or_404(draw_id)
+    return render_template('draw_result.html', draw=draw, result=draw_result(draw))
+
+
+@raffle_bp.route('/api/draws/<int:draw_id>')
+def api_draw(draw_id):
+    # El bitmap de vendidos va aparte del resultado canónico: lo cubre sold_digest
+    draw = Draw.query.get_or_404(draw_id)
+    return jsonify(dict(draw_result(draw), result_digest=draw.result_digest, sold_bitmap=sold_numbers_bitmap(draw)))
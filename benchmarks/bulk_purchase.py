@@ -0,0 +1,73 @@
+"""Costo por número de una compra según el tamaño del bloque.
+
+Compara la inserción actual (un INSERT de varias filas) con la anterior (un
+objeto ORM por número) para bloques de 10, 100 y 10.000 números.
+
+    python benchmarks/bulk_purchase.py
+    python benchmarks/bulk_purchase.py --database-url postgresql://localhost/rifa_bench --sizes 10 100 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import make_app, report, reset_database, seed_raffle
+
+
+def orm_insert(raffle, person, numbers):
+    # Camino anterior: un RaffleNumber por número a través del unit of work
+    from app import db
+    from app.models import RaffleNumber
+    with db.session.begin_nested():
+        db.session.add_all([RaffleNumber(number=number, person_id=person.id, raffle_id=raffle.id)
+                            for number in numbers])
+    return numbers
+
+
+def measure(app, raffle_id, size, repeat):
+    from app.purchases import purchase_numbers
+    timings = []
+    with app.app_context():
+        for i in range(repeat):
+            start = time.perf_counter()
+            purchase_numbers(raffle_id, size, first_name='Bench', last_name=str(i), address='-',
+                             reference_number=f'bulk-{size}-{i}', email=f'bulk{i}@example.com')
+            timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {'best_ms': round(best * 1000, 2), 'per_number_us': round(best / size * 1e6, 1)}
+
+
+def run(database_url, sizes, repeat):
+    import app.purchases
+
+    app_ = make_app(database_url)
+    results = {}
+    for mode, insert_numbers in (('bulk', app.purchases._insert_numbers), ('orm', orm_insert)):
+        original = app.purchases._insert_numbers
+        app.purchases._insert_numbers = insert_numbers
+        try:
+            results[mode] = {}
+            for size in sizes:
+                reset_database(app_)
+                raffle_id = seed_raffle(app_, size * repeat)
+                results[mode][size] = measure(app_, raffle_id, size, repeat)
+        finally:
+            app.purchases._insert_numbers = original
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bulk.db')
+    report(run(database_url, args.sizes, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import datetime
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+
+def make_config(database_url, **overrides):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SECRET_KEY = 'benchmark'
+        WTF_CSRF_ENABLED = False
+        RATE_PROVIDER = 'static'
+        # Las peticiones de los benchmarks no se suman a las métricas de producción
+        METRICS_DIR = tempfile.mkdtemp(prefix='metrics-')
+
+    for key, value in overrides.items():
+        setattr(BenchmarkConfig, key, value)
+    return BenchmarkConfig
+
+
+def make_app(database_url, **overrides):
+    from app import create_app
+    return create_app(make_config(database_url, **overrides))
+
+
+def reset_database(app):
+    from app import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+
+def seed_raffle(app, max_number, name=None):
+    from app import db
+    from app.models import Raffle
+    with app.app_context():
+        raffle = Raffle(name=name or f'bench-{max_number}', start_date=datetime.date.today(),
+                        max_number=max_number, valor_numero=1, available_count=max_number)
+        db.session.add(raffle)
+        db.session.commit()
+        return raffle.id
+
+
+def report(results):
+    json.dump(results, sys.stdout, indent=2, default=str)
+    sys.stdout.write('\n')
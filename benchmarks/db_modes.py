@@ -0,0 +1,40 @@
+"""Compara el rendimiento de compras concurrentes según el modo de base de datos.
+
+    python benchmarks/db_modes.py
+    python benchmarks/db_modes.py --postgres-url postgresql://localhost/rifa_bench
+"""
+import argparse
+import os
+import tempfile
+
+from common import report
+from purchase_load import run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--postgres-url')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--purchases', type=int, default=25)
+    parser.add_argument('--numbers', type=int, default=5)
+    parser.add_argument('--max-number', type=int, default=10000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    modes = [
+        ('sqlite-journal', 'sqlite:///' + os.path.join(tmp, 'journal.db'), {'SQLITE_WAL': False}),
+        ('sqlite-wal', 'sqlite:///' + os.path.join(tmp, 'wal.db'), {'SQLITE_WAL': True}),
+    ]
+    if args.postgres_url:
+        modes.append(('postgres', args.postgres_url, {}))
+
+    results = {}
+    for name, url, overrides in modes:
+        result = run(url, args.workers, args.purchases, args.numbers, args.max_number, overrides)
+        results[name] = {key: result[key] for key in
+                         ('purchases_ok', 'purchases_failed', 'purchases_per_s', 'p50_ms', 'p95_ms', 'consistent')}
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Tiempo y memoria de revelar los ganadores de un sorteo grande.
+
+Llena un sorteo con N números vendidos (por defecto un millón), lo cierra,
+publica el commit (que fija el bitmap de vendidos armado desde las filas) y
+mide el reveal: comprobar que los vendidos no cambiaron, elegir los ganadores
+y guardar el resultado. Luego repite la elección como lo haría un auditor,
+solo con lo publicado en ``/api/draws/<id>``.
+
+    python benchmarks/draw.py
+    python benchmarks/draw.py --sold 1000000 --max-number 1500000 --prizes 10
+    python benchmarks/draw.py --database-url postgresql://localhost/rifa_bench
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from common import make_app, report, reset_database, seed_raffle
+
+NUMBERS_PER_PERSON = 10
+INSERT_BATCH = 50000
+
+
+def fill(app, raffle_id, sold, max_number):
+    import random
+    from sqlalchemy import insert, update
+    from app import db
+    from app.models import Person, Raffle, RaffleNumber
+
+    numbers = random.Random(sold).sample(range(1, max_number + 1), sold)
+    persons = (sold + NUMBERS_PER_PERSON - 1) // NUMBERS_PER_PERSON
+    with app.app_context():
+        for start in range(0, persons, INSERT_BATCH):
+            db.session.execute(insert(Person), [
+                {'id': i + 1, 'first_name': 'Bench', 'last_name': str(i), 'address': '-',
+                 'reference_number': f'draw-{i}', 'email': f'draw{i}@example.com'}
+                for i in range(start, min(start + INSERT_BATCH, persons))
+            ])
+        for start in range(0, sold, INSERT_BATCH):
+            db.session.execute(insert(RaffleNumber), [
+                {'number': numbers[i], 'person_id': i // NUMBERS_PER_PERSON + 1, 'raffle_id': raffle_id}
+                for i in range(start, min(start + INSERT_BATCH, sold))
+            ])
+        db.session.execute(update(Raffle).where(Raffle.id == raffle_id)
+                           .values(available_count=max_number - sold, active=False))
+        db.session.commit()
+
+
+def run(database_url, sold, max_number, prizes):
+    import base64
+    from app import db
+    from app.draws import _sha256, commit_draw, pick_winners, reveal_draw, sold_bitmap
+    from app.models import Raffle
+
+    app = make_app(database_url)
+    reset_database(app)
+    raffle_id = seed_raffle(app, max_number)
+    start = time.perf_counter()
+    fill(app, raffle_id, sold, max_number)
+    fill_seconds = time.perf_counter() - start
+
+    with app.app_context():
+        raffle = db.session.get(Raffle, raffle_id)
+        start = time.perf_counter()
+        draw = commit_draw(raffle, [f'Premio {i + 1}' for i in range(prizes)], 'benchmark')
+        db.session.commit()
+        draw_id = draw.id
+        commit_seconds = time.perf_counter() - start
+        db.session.remove()
+
+    with app.app_context():
+        raffle = db.session.get(Raffle, raffle_id)
+        start = time.perf_counter()
+        sold_bitmap(raffle)
+        bitmap_seconds = time.perf_counter() - start
+        # Memoria de leer todos los vendidos, medida aparte porque tracemalloc hace más lenta la lectura
+        tracemalloc.start()
+        sold_bitmap(raffle)
+        bitmap_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        db.session.rollback()
+
+        start = time.perf_counter()
+        reveal_draw(raffle.draw, 'entropía de prueba')
+        db.session.commit()
+        reveal_seconds = time.perf_counter() - start
+
+    # Verificación como la haría un auditor: solo con los datos publicados
+    result = app.test_client().get(f'/api/draws/{draw_id}').get_json()
+    bitmap = base64.b64decode(result['sold_bitmap'])
+    start = time.perf_counter()
+    seed = _sha256(f'{result["seed"]}|{result["entropy"]}|{result["sold_digest"]}')
+    replay = pick_winners(seed, bytearray(bitmap), result['prizes'])
+    pick_seconds = time.perf_counter() - start
+
+    return {
+        'draw_id': draw_id,
+        'sold': sold,
+        'max_number': max_number,
+        'prizes': prizes,
+        'fill_s': round(fill_seconds, 2),
+        'commit_s': round(commit_seconds, 3),
+        'sold_bitmap_s': round(bitmap_seconds, 3),
+        'reveal_s': round(reveal_seconds, 3),
+        'pick_winners_ms': round(pick_seconds * 1000, 2),
+        'bitmap_bytes': len(bitmap),
+        'sold_bitmap_peak_mb': round(bitmap_peak / 1024 / 1024, 2),
+        'seed_matches_commit': _sha256(result['seed']) == result['seed_hash'],
+        'sold_digest_matches': _sha256(bitmap) == result['sold_digest'],
+        'bitmap_matches_max_number': len(bitmap) == result['max_number'] // 8 + 1,
+        'reproducible': replay == [winner['number'] for winner in result['winners']],
+        'winners': [winner['number'] for winner in result['winners']],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--sold', type=int, default=1000000)
+    parser.add_argument('--max-number', type=int)
+    parser.add_argument('--prizes', type=int, default=3)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'draw.db')
+    report(run(database_url, args.sold, args.max_number or args.sold, args.prizes))
+
+
+if __name__ == '__main__':
+    main()
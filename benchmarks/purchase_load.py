@@ -0,0 +1,116 @@
+"""Prueba de carga de compras concurrentes.
+
+Lanza varios procesos (como los workers de gunicorn) que compran números del
+mismo sorteo a la vez y luego verifica que no se perdió ni se duplicó ningún
+número.
+
+    python benchmarks/purchase_load.py --workers 8 --purchases 50 --numbers 5
+    python benchmarks/purchase_load.py --database-url postgresql://localhost/rifa_bench
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common import make_app, report, reset_database, seed_raffle
+
+
+def _worker(args):
+    database_url, overrides, raffle_id, purchases, numbers, worker_id = args
+    from app import db
+    from app.allocation import NotEnoughNumbers
+    from app.purchases import PurchaseFailed, purchase_numbers
+
+    app = make_app(database_url, **overrides)
+    ok, failed, latencies = 0, 0, []
+    with app.app_context():
+        started = time.time()
+        for i in range(purchases):
+            start = time.perf_counter()
+            try:
+                purchase_numbers(raffle_id, numbers, first_name='Load', last_name=str(worker_id),
+                                 address='-', reference_number=f'{worker_id}-{i}',
+                                 email=f'load{worker_id}@example.com')
+                ok += 1
+            except (NotEnoughNumbers, PurchaseFailed):
+                failed += 1
+            latencies.append(time.perf_counter() - start)
+        finished = time.time()
+        db.session.remove()
+    return ok, failed, latencies, started, finished
+
+
+def verify(app, raffle_id):
+    from sqlalchemy import func, select
+    from app import db
+    from app.models import NumberPoolSlot, Person, Raffle, RaffleNumber
+
+    with app.app_context():
+        raffle = db.session.get(Raffle, raffle_id)
+        sold = list(db.session.scalars(select(RaffleNumber.number).where(RaffleNumber.raffle_id == raffle_id)))
+        slots = dict(db.session.execute(
+            select(NumberPoolSlot.slot, NumberPoolSlot.number).where(NumberPoolSlot.raffle_id == raffle_id)).all())
+        free = [slots.get(slot, slot + 1) for slot in range(raffle.available_count)]
+        orphans = db.session.scalar(
+            select(func.count(Person.id)).where(~Person.raffle_numbers.any()))
+        return {
+            'sold': len(sold),
+            'duplicated': len(sold) - len(set(sold)),
+            'free': len(free),
+            'lost': raffle.max_number - len(set(sold) | set(free)),
+            'overlap': len(set(sold) & set(free)),
+            'orphan_persons': orphans,
+        }
+
+
+def run(database_url, workers, purchases, numbers, max_number, overrides=None):
+    overrides = overrides or {}
+    app = make_app(database_url, **overrides)
+    reset_database(app)
+    raffle_id = seed_raffle(app, max_number)
+
+    jobs = [(database_url, overrides, raffle_id, purchases, numbers, w) for w in range(workers)]
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        results = pool.map(_worker, jobs)
+    # Solo se mide la ventana de compras, no el arranque de los procesos
+    elapsed = max(r[4] for r in results) - min(r[3] for r in results)
+
+    latencies = sorted(lat for r in results for lat in r[2])
+    ok = sum(r[0] for r in results)
+    checks = verify(app, raffle_id)
+    return {
+        'database_url': database_url,
+        'workers': workers,
+        'purchases_ok': ok,
+        'purchases_failed': sum(r[1] for r in results),
+        'elapsed_s': round(elapsed, 3),
+        'purchases_per_s': round(ok / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        'checks': checks,
+        'consistent': all(checks[key] == 0 for key in ('duplicated', 'lost', 'overlap', 'orphan_persons'))
+                      and checks['sold'] == ok * numbers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--purchases', type=int, default=25, help='compras por worker')
+    parser.add_argument('--numbers', type=int, default=5, help='números por compra')
+    parser.add_argument('--max-number', type=int, default=10000)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+
+    result = run(database_url, args.workers, args.purchases, args.numbers, args.max_number)
+    report(result)
+    raise SystemExit(0 if result['consistent'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""Suite de benchmarks de la compra pública y las vistas de administración.
+
+Para cada tamaño de sorteo (1k, 100k y 1M números por defecto) crea una base
+nueva con ``create_app()``, llena el sorteo por niveles y mide:
+
+- ``purchase``: latencia y consultas SQL de ``GET /`` y de ``POST /``
+  comprando ``--numbers`` números, en cada nivel de llenado.
+- ``admin``: tiempo y consultas de list_raffles, list_numbers, list_person y
+  de sus APIs (primera página, página profunda y búsqueda) con el sorteo lleno.
+- ``concurrent``: compras por segundo con varios procesos
+  (``purchase_load.run``) sobre un sorteo nuevo del mismo tamaño.
+
+El resultado es JSON con el commit, la versión de Python y la base usada, para
+comparar entre versiones. Con ``--baseline`` se marcan las medianas, consultas
+y compras por segundo que empeoraron más de ``--tolerance`` y el proceso
+termina con código 1.
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --sizes 1000 100000 --baseline bench.json
+    python benchmarks/run.py --database-url postgresql://localhost/rifa_bench
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import make_app, report, reset_database, seed_raffle
+import purchase_load
+
+FILL_LEVELS = (0.0, 0.5, 0.9, 0.99)
+NUMBERS_PER_PERSON = 5
+INSERT_BATCH = 50000
+# Diferencia mínima para considerar que una latencia empeoró (ruido de medición)
+NOISE_MS = 2.0
+
+# Sin límite de peticiones (se mide la aplicación) y con el conteo de SQL en las cabeceras
+BENCH_OVERRIDES = {'RATELIMIT_ENABLED': False, 'SQL_STATS_HEADERS': True, 'LOGIN_DISABLED': True,
+                   'SQL_QUERY_WARNING_THRESHOLD': 0}
+
+PURCHASE_FORM = {'first_name': 'Bench', 'last_name': 'Suite', 'address': '-', 'reference_number': 'bench',
+                 'bank_account': '04142107454'}
+
+
+def metadata(database_url):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import sqlalchemy
+    return {
+        'commit': commit,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'platform': platform.platform(),
+        'database': database_url.split(':', 1)[0],
+    }
+
+
+def summarize(timings, queries):
+    timings = sorted(timings)
+    return {
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 2),
+        'p95_ms': round(timings[min(int(len(timings) * 0.95), len(timings) - 1)] * 1000, 2),
+        'queries': max(queries),
+    }
+
+
+def measure(client, repeat, method, url, data=None):
+    # data puede ser una función (un formulario distinto en cada repetición)
+    if method == 'GET':
+        client.get(url).close()  # la primera petición calienta plantillas y cachés; no se mide
+    timings, queries = [], []
+    for i in range(repeat):
+        form = data(i) if callable(data) else data
+        start = time.perf_counter()
+        response = client.open(url, method=method, data=form)
+        timings.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {url} respondió {response.status_code}')
+        response.close()
+        queries.append(int(response.headers.get('X-SQL-Count', 0)))
+    return summarize(timings, queries)
+
+
+def fill(app, raffle_id, target):
+    # Vende números libres al azar hasta llegar a target vendidos y reconstruye el pool
+    from sqlalchemy import func, insert, select
+    from app import db
+    from app.allocation import rebuild_pool
+    from app.models import Person, Raffle, RaffleNumber
+
+    sold = _sold(app, raffle_id)
+    with app.app_context():
+        raffle = db.session.get(Raffle, raffle_id)
+        missing = target - sold
+        if missing <= 0:
+            return sold
+        used = set(db.session.scalars(select(RaffleNumber.number).where(RaffleNumber.raffle_id == raffle_id)))
+        free = [number for number in range(1, raffle.max_number + 1) if number not in used]
+        numbers = random.Random(target).sample(free, missing)
+        first_person = (db.session.scalar(select(func.max(Person.id))) or 0) + 1
+        persons = (missing + NUMBERS_PER_PERSON - 1) // NUMBERS_PER_PERSON
+        for start in range(0, persons, INSERT_BATCH):
+            db.session.execute(insert(Person), [
+                {'id': first_person + i, 'first_name': 'Seed', 'last_name': str(i), 'address': '-',
+                 'reference_number': f'seed-{first_person + i}', 'email': f'seed{first_person + i}@example.com'}
+                for i in range(start, min(start + INSERT_BATCH, persons))
+            ])
+        for start in range(0, missing, INSERT_BATCH):
+            db.session.execute(insert(RaffleNumber), [
+                {'number': numbers[i], 'person_id': first_person + i // NUMBERS_PER_PERSON, 'raffle_id': raffle_id}
+                for i in range(start, min(start + INSERT_BATCH, missing))
+            ])
+        rebuild_pool(raffle)
+        db.session.commit()
+        return target
+
+
+def undo_purchases(app):
+    # Borra las compras medidas (sus números vuelven al pool) para que el siguiente nivel parta de su llenado
+    from app import db
+    from app.models import Person
+    from app.retention import _purge_persons
+    with app.app_context():
+        _purge_persons(Person.email.startswith('bench-'))
+        db.session.commit()
+
+
+def bench_purchases(app, raffle_id, size, repeat, numbers):
+    from app.cache import raffle_cache
+
+    client = app.test_client()
+    results = {}
+    # Siempre quedan números para las compras medidas, aunque el sorteo sea chico
+    reserve = repeat * numbers
+    for level in FILL_LEVELS:
+        sold = fill(app, raffle_id, min(int(size * level), size - reserve))
+        with app.app_context():
+            raffle_cache().invalidate()
+
+        def purchase_form(i, level=level):
+            return dict(PURCHASE_FORM, email=f'bench-{level}-{i}@example.com', num_numbers='custom',
+                        custom_number=str(numbers))
+
+        results[f'{level:.0%}'] = {
+            'sold_before': sold,
+            'get': measure(client, repeat, 'GET', '/'),
+            'post': measure(client, repeat, 'POST', '/', purchase_form),
+        }
+        # POST / redirige también cuando la compra falla: se comprueba que se vendió lo esperado
+        if _sold(app, raffle_id) != sold + reserve:
+            raise RuntimeError(f'Las compras al {level:.0%} no vendieron los {reserve} números esperados')
+        undo_purchases(app)
+    return results
+
+
+def _sold(app, raffle_id):
+    from sqlalchemy import func, select
+    from app import db
+    from app.models import RaffleNumber
+    with app.app_context():
+        return db.session.scalar(select(func.count()).where(RaffleNumber.raffle_id == raffle_id))
+
+
+def bench_admin(app, raffle_id, repeat):
+    from sqlalchemy import func, select
+    from app import db
+    from app.models import Person, RaffleNumber
+    from app.queries import encode_cursor
+
+    sold = _sold(app, raffle_id)
+    with app.app_context():
+        persons = db.session.scalar(select(func.count(Person.id)))
+        middle = db.session.scalar(select(func.max(RaffleNumber.id))) // 2
+
+    client = app.test_client()
+    pages = {
+        'list_raffles': '/list_raffles',
+        'list_numbers': f'/list_numbers?raffle_id={raffle_id}',
+        'api_numbers': f'/api/numbers?raffle_id={raffle_id}&length=50',
+        'api_numbers_deep': f'/api/numbers?raffle_id={raffle_id}&length=50&start={sold // 2}',
+        'api_numbers_cursor': f'/api/numbers?raffle_id={raffle_id}&length=50&cursor={encode_cursor([middle, middle])}',
+        'api_numbers_search': f'/api/numbers?raffle_id={raffle_id}&length=50&search=Seed1@example.com',
+        'list_person': f'/list_person?raffle_id={raffle_id}',
+        'api_persons': f'/api/persons?raffle_id={raffle_id}&length=50',
+        'api_persons_deep': f'/api/persons?raffle_id={raffle_id}&length=50&start={persons // 2}',
+        'api_persons_search': f'/api/persons?raffle_id={raffle_id}&length=50&search=Seed1@example.com',
+    }
+    return {name: measure(client, repeat, 'GET', url) for name, url in pages.items()}
+
+
+def bench_concurrent(database_url, size, workers, purchases, numbers):
+    result = purchase_load.run(database_url, workers, purchases, numbers, size, BENCH_OVERRIDES)
+    return {key: result[key] for key in ('workers', 'purchases_ok', 'purchases_per_s', 'p50_ms', 'p95_ms',
+                                         'consistent')}
+
+
+def run(database_url, sizes, repeat, numbers, workers, purchases):
+    results = {}
+    for size in sizes:
+        app = make_app(database_url, **BENCH_OVERRIDES)
+        reset_database(app)
+        raffle_id = seed_raffle(app, size)
+        start = time.perf_counter()
+        purchase = bench_purchases(app, raffle_id, size, repeat, numbers)
+        admin = bench_admin(app, raffle_id, repeat)
+        elapsed = time.perf_counter() - start
+        results[str(size)] = {
+            'purchase': purchase,
+            'admin': admin,
+            'concurrent': bench_concurrent(database_url, size, workers, purchases, numbers),
+            'elapsed_s': round(elapsed, 1),
+        }
+        print(f'{size}: {elapsed:.1f} s', file=sys.stderr)
+    return results
+
+
+def _flatten(results, prefix=''):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{key}.')
+        else:
+            yield f'{prefix}{key}', value
+
+
+def compare(results, baseline, tolerance):
+    # Medianas y consultas que subieron, o compras por segundo que bajaron; el p95 es muy ruidoso para comparar
+    previous = dict(_flatten(baseline['results']))
+    regressions = []
+    for path, value in _flatten(results):
+        old = previous.get(path)
+        if not isinstance(old, (int, float)) or isinstance(old, bool):
+            continue
+        if path.endswith('p50_ms'):
+            worse = value > old * (1 + tolerance) and value - old > NOISE_MS
+        elif path.endswith('.queries'):
+            worse = value > old
+        elif path.endswith('purchases_per_s'):
+            worse = value < old * (1 - tolerance)
+        else:
+            continue
+        if worse:
+            regressions.append({'metric': path, 'baseline': old, 'current': value})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20, help='repeticiones por medición')
+    parser.add_argument('--numbers', type=int, default=5, help='números por compra')
+    parser.add_argument('--workers', type=int, default=4, help='procesos de la prueba concurrente')
+    parser.add_argument('--purchases', type=int, default=25, help='compras por proceso')
+    parser.add_argument('--output', help='archivo JSON de salida (por defecto stdout)')
+    parser.add_argument('--baseline', help='JSON de una corrida anterior para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='empeoramiento aceptado (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'suite.db')
+
+    output = {
+        'meta': metadata(database_url),
+        'params': {'sizes': args.sizes, 'fill_levels': FILL_LEVELS, 'repeat': args.repeat,
+                   'numbers': args.numbers, 'workers': args.workers, 'purchases': args.purchases},
+        'results': run(database_url, args.sizes, args.repeat, args.numbers, args.workers, args.purchases),
+    }
+    if args.baseline:
+        with open(args.baseline) as fp:
+            output['regressions'] = compare(output['results'], json.load(fp), args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(output, fp, indent=2, default=str)
+            fp.write('\n')
+    else:
+        report(output)
+    raise SystemExit(1 if output.get('regressions') else 0)
+
+
+if __name__ == '__main__':
+    main()
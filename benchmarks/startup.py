@@ -0,0 +1,165 @@
+"""Tiempo de arranque y memoria de los workers web.
+
+Cada medición corre en un proceso nuevo que importa el punto de entrada WSGI
+(por defecto ``wsgi:app``, como ``gunicorn --preload wsgi:app``):
+
+- ``startup``: segundos hasta tener la aplicación lista, memoria residente,
+  módulos importados y cuáles de las dependencias pesadas (alembic,
+  requests, Pillow) quedaron cargadas sin haberse usado.
+- ``workers``: bifurca ``--workers`` procesos como gunicorn, con la
+  aplicación creada antes del fork (``--preload``) o dentro de cada worker, y
+  cada uno atiende unas peticiones. De cada worker se lee la memoria privada
+  (USS) y proporcional (PSS) en /proc/<pid>/smaps_rollup; con preload las
+  páginas del maestro se comparten y cada worker suma menos.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --workers 8 --repeat 10
+    python benchmarks/startup.py --entry app:app   # árbol anterior, para comparar
+"""
+import argparse
+import importlib
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ('alembic', 'flask_migrate', 'requests', 'PIL.Image')
+WORKER_PATHS = ('/', '/conversion_rate', '/static/css/style_base.css')
+
+
+def memory(pid='self'):
+    # En MB; USS = páginas privadas del proceso, PSS = privadas + su parte de las compartidas
+    values = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as fp:
+            for line in fp:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    values[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        return None
+    return {'rss_mb': round(values['Rss'], 1), 'pss_mb': round(values['Pss'], 1),
+            'uss_mb': round(values['Private_Clean'] + values['Private_Dirty'], 1)}
+
+
+def load_entry(entry):
+    module, _, attribute = entry.partition(':')
+    return getattr(importlib.import_module(module), attribute or 'app')
+
+
+def child_startup(entry):
+    start = time.perf_counter()
+    load_entry(entry)
+    elapsed = time.perf_counter() - start
+    return {
+        'startup_s': round(elapsed, 3),
+        'rss_mb': (memory() or {}).get('rss_mb'),
+        'modules': len(sys.modules),
+        'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def child_workers(entry, workers, requests, preload):
+    # Hace de maestro de gunicorn: bifurca los workers, espera a que atiendan y lee su memoria
+    app = load_entry(entry) if preload else None
+    ready_read, ready_write = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            worker_app = app or load_entry(entry)
+            client = worker_app.test_client()
+            for _ in range(requests):
+                for path in WORKER_PATHS:
+                    client.get(path).close()
+            os.write(ready_write, b'.')
+            time.sleep(600)
+            os._exit(0)
+        pids.append(pid)
+    os.close(ready_write)
+    received = 0
+    while received < workers:
+        received += len(os.read(ready_read, workers))
+
+    per_worker = [memory(pid) for pid in pids]
+    master = memory()
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    if None in per_worker:
+        return {'error': '/proc/<pid>/smaps_rollup no disponible (solo Linux)'}
+    return {
+        'master': master,
+        'worker_uss_mb': round(statistics.median(m['uss_mb'] for m in per_worker), 1),
+        'worker_pss_mb': round(statistics.median(m['pss_mb'] for m in per_worker), 1),
+        # Memoria total del grupo maestro + workers sin contar dos veces lo compartido
+        'total_pss_mb': round(master['pss_mb'] + sum(m['pss_mb'] for m in per_worker), 1),
+    }
+
+
+def run_child(args, env):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__)] + args, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(entry, repeat, workers, requests):
+    # common importa config: los procesos hijos no deben tenerlo cargado antes de medir
+    from common import make_app, reset_database, seed_raffle
+
+    directory = tempfile.mkdtemp()
+    database_url = 'sqlite:///' + os.path.join(directory, 'startup.db')
+    app = make_app(database_url)
+    reset_database(app)
+    seed_raffle(app, 1000)
+
+    # Los procesos hijos leen la configuración del entorno, como en producción
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY='benchmark', RATE_PROVIDER='static',
+               METRICS_DIR=os.path.join(directory, 'metrics'), PYTHONPATH=root)
+    samples = [run_child(['--child-startup', entry], env) for _ in range(repeat)]
+    startup = {
+        'startup_s': statistics.median(s['startup_s'] for s in samples),
+        'startup_min_s': min(s['startup_s'] for s in samples),
+        'rss_mb': statistics.median(s['rss_mb'] for s in samples if s['rss_mb'] is not None)
+        if samples[0]['rss_mb'] is not None else None,
+        'modules': samples[0]['modules'],
+        'heavy_modules': samples[0]['heavy_modules'],
+    }
+    return {
+        'entry': entry,
+        'repeat': repeat,
+        'startup': startup,
+        'workers': {
+            mode: run_child(['--child-workers', entry, str(workers), str(requests), mode], env)
+            for mode in ('preload', 'no-preload')
+        },
+    }
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child-startup':
+        print(json.dumps(child_startup(sys.argv[2])))
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == '--child-workers':
+        _, _, entry, workers, requests, mode = sys.argv
+        print(json.dumps(child_workers(entry, int(workers), int(requests), mode == 'preload')))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entry', default='wsgi:app', help='módulo:atributo de la aplicación WSGI')
+    parser.add_argument('--repeat', type=int, default=5, help='arranques medidos')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20, help='rondas de peticiones por worker')
+    args = parser.parse_args()
+    from common import report
+    report(run(args.entry, args.repeat, args.workers, args.requests))
+
+
+if __name__ == '__main__':
+    main()
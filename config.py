@@ -1,26 +1,98 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+
+def database_url():
+    url = os.getenv('DATABASE_URL', 'sqlite:///rifa.db')
+    # Heroku y otros proveedores entregan el esquema antiguo de Postgres
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
 
 class Config:
 
     SECRET_KEY = os.getenv('SECRET_KEY')
     REGISTER_KEY = os.getenv('REGISTER_KEY')
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///rifa.db'
+    SQLALCHEMY_DATABASE_URI = database_url()
+    # Pool de conexiones (no aplica a SQLite)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))  # segundos esperando una conexión libre
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    # SQLite
+    SQLITE_WAL = os.getenv('SQLITE_WAL', 'true').lower() == 'true'
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))  # milisegundos
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    MAIL_SERVER = 'smtp.gmail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    # Cabeceras X-SQL-Count / X-SQL-Time y aviso en el log si una petición hace demasiadas consultas
+    SQL_STATS_HEADERS = os.getenv('SQL_STATS_HEADERS', 'false').lower() == 'true'
+    SQL_QUERY_WARNING_THRESHOLD = int(os.getenv('SQL_QUERY_WARNING_THRESHOLD', 20))
+    # Para pruebas locales: MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_USERNAME')
+    # Caché del sorteo activo (segundos); los cambios de sorteo lo invalidan en todos los workers
+    ACTIVE_RAFFLE_CACHE_TTL = int(os.getenv('ACTIVE_RAFFLE_CACHE_TTL', 60))
+    RAFFLE_COUNT_CACHE_TTL = int(os.getenv('RAFFLE_COUNT_CACHE_TTL', 5))
+    # Contador en vivo (SSE): lectura por worker, keepalive y duración máxima de cada conexión (segundos)
+    SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', 1))
+    SSE_KEEPALIVE = int(os.getenv('SSE_KEEPALIVE', 15))
+    SSE_MAX_DURATION = int(os.getenv('SSE_MAX_DURATION', 300))
+    # Cada conexión SSE ocupa un hilo del worker (GUNICORN_THREADS, como en el Procfile) mientras dura;
+    # SSE_RESERVED_THREADS quedan siempre libres para las páginas y las compras
+    WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', 64))
+    SSE_RESERVED_THREADS = int(os.getenv('SSE_RESERVED_THREADS', 16))
+    SSE_MAX_CLIENTS = int(os.getenv('SSE_MAX_CLIENTS', max(WORKER_THREADS - SSE_RESERVED_THREADS, 0)))  # por worker
+    SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 3000))
+    # Máximo de números por compra en bloque (pantalla "Asignar bloque" y /api/purchases)
+    BULK_PURCHASE_MAX_NUMBERS = int(os.getenv('BULK_PURCHASE_MAX_NUMBERS', 10000))
+    # Tamaño máximo del estado de cuenta a conciliar
+    STATEMENT_MAX_BYTES = int(os.getenv('STATEMENT_MAX_BYTES', 10 * 1024 * 1024))
+    # Filas leídas por bloque al exportar CSV / XLSX
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+    # Antigüedad (horas) a partir de la cual se eliminan las personas sin confirmar
+    UNCONFIRMED_PURGE_HOURS = int(os.getenv('UNCONFIRMED_PURGE_HOURS', 48))
+    # Caché HTTP de estáticos con huella e imágenes con hash (segundos)
+    STATIC_MAX_AGE = 365 * 24 * 3600
+    MEDIA_LEGACY_MAX_AGE = int(os.getenv('MEDIA_LEGACY_MAX_AGE', 86400))
+    # Cola de correos
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+    MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 6))
+    MAIL_RETRY_BACKOFF = int(os.getenv('MAIL_RETRY_BACKOFF', 60))  # segundos, se duplica en cada intento
+    # Límites de peticiones (flask-limiter). memory:// es por worker: en producción un almacenamiento
+    # compartido, por ejemplo RATELIMIT_STORAGE_URI=redis://localhost:6379/0
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+    RATELIMIT_KEY_PREFIX = 'rifa'
+    RATELIMIT_HEADERS_ENABLED = True
+    RATELIMIT_SWALLOW_ERRORS = True
+    RATELIMIT_PURCHASE_IP = os.getenv('RATELIMIT_PURCHASE_IP', '10/minute;60/hour')
+    RATELIMIT_PURCHASE_EMAIL = os.getenv('RATELIMIT_PURCHASE_EMAIL', '5/10 minutes;20/day')
+    RATELIMIT_CONVERSION_RATE = os.getenv('RATELIMIT_CONVERSION_RATE', '60/minute')
+    # Proxies delante de la app (nginx, router de Heroku) cuyo X-Forwarded-For se acepta; 0 = ninguno
+    PROXY_COUNT = int(os.getenv('PROXY_COUNT', 0))
+    # /metrics (formato Prometheus): con METRICS_TOKEN se exige "Authorization: Bearer <token>",
+    # sin él solo un administrador con sesión
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 5))  # segundos entre volcados de cada worker
+    METRICS_DIR = os.getenv('METRICS_DIR')  # archivos de métricas por proceso; por defecto instance/metrics
+    # Perfilador por sesión de administrador: líneas de pstats por petición y archivos que se conservan
+    PROFILER_LINES = int(os.getenv('PROFILER_LINES', 40))
+    PROFILER_KEEP = int(os.getenv('PROFILER_KEEP', 50))
     API_KEY = os.getenv('API_KEY')
     API_URL = 'https://api.exchangerate-api.com/v4/latest/USD'
 
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'media/images')
+    # Tasa de cambio: 'http' consulta API_URL, 'static' usa RATE_STATIC_VALUE (pruebas sin red)
+    RATE_PROVIDER = os.getenv('RATE_PROVIDER', 'http')
+    RATE_STATIC_VALUE = float(os.getenv('RATE_STATIC_VALUE', '36.5'))
+    RATE_CURRENCY = 'VES'
+    RATE_CACHE_TTL = int(os.getenv('RATE_CACHE_TTL', 900))  # segundos
+    RATE_REFRESH_AHEAD = int(os.getenv('RATE_REFRESH_AHEAD', 120))  # refrescar antes de expirar
+    RATE_MAX_STALE = int(os.getenv('RATE_MAX_STALE', 86400))  # servir tasa vieja si la API falla
+    RATE_HTTP_TIMEOUT = float(os.getenv('RATE_HTTP_TIMEOUT', 3))
 
-# Crear la carpeta de media si no existe
-if not os.path.exists(Config.UPLOAD_FOLDER):
-    os.makedirs(Config.UPLOAD_FOLDER)
\ No newline at end of file
+    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'media/images')  # la crea init_images
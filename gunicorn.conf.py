@@ -0,0 +1,10 @@
+"""Configuración de gunicorn; se lee sola desde el directorio de trabajo."""
+
+
+def on_starting(server):
+    # Con --preload la aplicación ya está creada en el maestro; los archivos de métricas de una
+    # ejecución anterior se borran antes de bifurcar los workers
+    from app.metrics import clear, metrics_directory
+    from wsgi import app
+
+    clear(metrics_directory(app))
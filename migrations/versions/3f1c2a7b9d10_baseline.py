@@ -0,0 +1,67 @@
+"""baseline
+
+Revision ID: 3f1c2a7b9d10
+Revises: 
+Create Date: 2026-10-18 16:05:12.184310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7b9d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Esquema original; en una base ya existente basta con `flask db stamp 3f1c2a7b9d10`
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=150), nullable=False),
+    sa.Column('email', sa.String(length=150), nullable=False),
+    sa.Column('password', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('person',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('first_name', sa.String(length=50), nullable=False),
+    sa.Column('last_name', sa.String(length=50), nullable=False),
+    sa.Column('address', sa.String(length=200), nullable=False),
+    sa.Column('reference_number', sa.String(length=100), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('confirmed', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('raffle',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('active', sa.Boolean(), nullable=True),
+    sa.Column('max_number', sa.Integer(), nullable=False),
+    sa.Column('valor_numero', sa.Integer(), nullable=False),
+    sa.Column('image_filename', sa.String(length=255), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('raffle_number',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('number', sa.String(length=10), nullable=False),
+    sa.Column('person_id', sa.Integer(), nullable=False),
+    sa.Column('raffle_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['person_id'], ['person.id'], ),
+    sa.ForeignKeyConstraint(['raffle_id'], ['raffle.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('number', 'raffle_id', name='uix_number_raffle_id')
+    )
+
+
+def downgrade():
+    op.drop_table('raffle_number')
+    op.drop_table('raffle')
+    op.drop_table('person')
+    op.drop_table('user')
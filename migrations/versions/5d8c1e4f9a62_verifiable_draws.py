@@ -0,0 +1,58 @@
+"""verifiable draws
+
+Revision ID: 5d8c1e4f9a62
+Revises: a91f3c5e7d24
+Create Date: 2026-10-18 21:05:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5d8c1e4f9a62'
+down_revision = 'a91f3c5e7d24'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('draw',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('raffle_id', sa.Integer(), nullable=True),
+    sa.Column('raffle_name', sa.String(length=100), nullable=False),
+    sa.Column('prizes', sa.Text(), nullable=False),
+    sa.Column('seed_hash', sa.String(length=64), nullable=False),
+    sa.Column('seed', sa.String(length=64), nullable=False),
+    sa.Column('entropy_source', sa.String(length=255), nullable=True),
+    sa.Column('entropy', sa.String(length=255), nullable=True),
+    sa.Column('committed_at', sa.DateTime(), nullable=False),
+    sa.Column('revealed_at', sa.DateTime(), nullable=True),
+    sa.Column('sold_count', sa.Integer(), nullable=True),
+    sa.Column('sold_digest', sa.String(length=64), nullable=True),
+    sa.Column('result_digest', sa.String(length=64), nullable=True),
+    sa.ForeignKeyConstraint(['raffle_id'], ['raffle.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('raffle_id')
+    )
+    op.create_table('draw_winner',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('draw_id', sa.Integer(), nullable=False),
+    sa.Column('tier', sa.Integer(), nullable=False),
+    sa.Column('prize', sa.String(length=200), nullable=False),
+    sa.Column('number', sa.Integer(), nullable=False),
+    sa.Column('first_name', sa.String(length=50), nullable=False),
+    sa.Column('last_name', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.ForeignKeyConstraint(['draw_id'], ['draw.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('draw_id', 'tier', name='uix_draw_winner_draw_id_tier')
+    )
+    with op.batch_alter_table('draw_winner', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_draw_winner_draw_id'), ['draw_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('draw_winner', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_draw_winner_draw_id'))
+
+    op.drop_table('draw_winner')
+    op.drop_table('draw')
@@ -0,0 +1,92 @@
+"""cascading deletes and raffle archive
+
+Revision ID: 64b7f2717382
+Revises: e7b3a9c4d218
+Create Date: 2026-10-18 18:40:12.284617
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = '64b7f2717382'
+down_revision = 'e7b3a9c4d218'
+branch_labels = None
+depends_on = None
+
+
+# Las claves foráneas originales no tienen nombre: Postgres las llama <tabla>_<columna>_fkey
+# y en SQLite se les asigna ese mismo nombre al reflejarlas con esta convención
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# (tabla, columna, tabla referida)
+FOREIGN_KEYS = (
+    ('raffle_number', 'person_id', 'person'),
+    ('raffle_number', 'raffle_id', 'raffle'),
+    ('number_pool_slot', 'raffle_id', 'raffle'),
+    ('email_message', 'person_id', 'person'),
+)
+
+
+def _replace_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            name = f'{table}_{column}_fkey'
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    op.create_table('archived_raffle',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('raffle_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('max_number', sa.Integer(), nullable=False),
+    sa.Column('valor_numero', sa.Integer(), nullable=False),
+    sa.Column('image_filename', sa.String(length=255), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('archived_raffle_number',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('archived_raffle_id', sa.Integer(), nullable=False),
+    sa.Column('number', sa.Integer(), nullable=False),
+    sa.Column('first_name', sa.String(length=50), nullable=False),
+    sa.Column('last_name', sa.String(length=50), nullable=False),
+    sa.Column('address', sa.String(length=200), nullable=False),
+    sa.Column('reference_number', sa.String(length=100), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('confirmed', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['archived_raffle_id'], ['archived_raffle.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_raffle_number', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_raffle_number_archived_raffle_id'), ['archived_raffle_id'], unique=False)
+
+    _replace_foreign_keys('CASCADE')
+
+    # Las personas existentes quedan con la fecha de la migración
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.execute(sa.table('person', sa.column('created_at', sa.DateTime())).update().values(created_at=datetime.utcnow()))
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_person_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_person_created_at'))
+        batch_op.drop_column('created_at')
+
+    _replace_foreign_keys(None)
+
+    with op.batch_alter_table('archived_raffle_number', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_raffle_number_archived_raffle_id'))
+
+    op.drop_table('archived_raffle_number')
+    op.drop_table('archived_raffle')
@@ -0,0 +1,88 @@
+"""number pool, exchange rates and email queue
+
+Revision ID: 8a4e6d2c1b57
+Revises: 3f1c2a7b9d10
+Create Date: 2026-10-18 16:07:40.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6d2c1b57'
+down_revision = '3f1c2a7b9d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('number_pool_slot',
+    sa.Column('raffle_id', sa.Integer(), nullable=False),
+    sa.Column('slot', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('number', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['raffle_id'], ['raffle.id'], ),
+    sa.PrimaryKeyConstraint('raffle_id', 'slot')
+    )
+    op.create_table('exchange_rate',
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('rate', sa.Float(), nullable=False),
+    sa.Column('fetched_at', sa.Float(), nullable=False),
+    sa.Column('refresh_claimed_at', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('currency')
+    )
+    op.create_table('email_message',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('person_id', sa.Integer(), nullable=True),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('recipient', sa.String(length=120), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=False),
+    sa.Column('html', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('claim_token', sa.String(length=32), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['person_id'], ['person.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('email_message', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_email_message_claim_token'), ['claim_token'], unique=False)
+        batch_op.create_index(batch_op.f('ix_email_message_person_id'), ['person_id'], unique=False)
+        batch_op.create_index('ix_email_message_status_next_attempt_at', ['status', 'next_attempt_at'], unique=False)
+
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_person_email'), ['email'], unique=False)
+        batch_op.create_index(batch_op.f('ix_person_reference_number'), ['reference_number'], unique=False)
+
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_count', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('raffle_number', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_raffle_number_person_id'), ['person_id'], unique=False)
+        batch_op.create_index('ix_raffle_number_raffle_id_id', ['raffle_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('raffle_number', schema=None) as batch_op:
+        batch_op.drop_index('ix_raffle_number_raffle_id_id')
+        batch_op.drop_index(batch_op.f('ix_raffle_number_person_id'))
+
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.drop_column('available_count')
+
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_person_reference_number'))
+        batch_op.drop_index(batch_op.f('ix_person_email'))
+
+    with op.batch_alter_table('email_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_email_message_status_next_attempt_at')
+        batch_op.drop_index(batch_op.f('ix_email_message_person_id'))
+        batch_op.drop_index(batch_op.f('ix_email_message_claim_token'))
+
+    op.drop_table('email_message')
+    op.drop_table('exchange_rate')
+    op.drop_table('number_pool_slot')
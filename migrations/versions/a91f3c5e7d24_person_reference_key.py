@@ -0,0 +1,46 @@
+"""person reference key
+
+Revision ID: a91f3c5e7d24
+Revises: 64b7f2717382
+Create Date: 2026-10-18 19:26:51.930472
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = 'a91f3c5e7d24'
+down_revision = '64b7f2717382'
+branch_labels = None
+depends_on = None
+
+
+def normalize_reference(reference):
+    # Copia de app.models.normalize_reference al momento de esta migración
+    key = re.sub(r'[^0-9A-Za-z]', '', reference or '').upper().lstrip('0')
+    return key or None
+
+
+def upgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reference_key', sa.String(length=100), nullable=True))
+        batch_op.create_index(batch_op.f('ix_person_reference_key'), ['reference_key'], unique=False)
+
+    person = sa.table('person', sa.column('id', sa.Integer()), sa.column('reference_number', sa.String()),
+                      sa.column('reference_key', sa.String()))
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(person.c.id, person.c.reference_number)).all()
+    updates = [{'person_id': person_id, 'key': normalize_reference(reference)} for person_id, reference in rows]
+    if updates:
+        bind.execute(
+            person.update().where(person.c.id == sa.bindparam('person_id')).values(reference_key=sa.bindparam('key')),
+            updates,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_person_reference_key'))
+        batch_op.drop_column('reference_key')
@@ -0,0 +1,32 @@
+"""person search indexes
+
+Revision ID: a9c2e5f7b314
+Revises: d4a7e9b2c631
+Create Date: 2026-10-19 16:40:12.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c2e5f7b314'
+down_revision = 'd4a7e9b2c631'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # La búsqueda compara por igualdad lower(email) y reference_key (que ya tiene índice);
+    # los índices sobre las columnas tal cual no servían para el LIKE 'x%' que se usaba
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.drop_index('ix_person_reference_number')
+        batch_op.drop_index('ix_person_email')
+    op.create_index('ix_person_email_lower', 'person', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_person_email_lower', table_name='person')
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.create_index('ix_person_email', ['email'], unique=False)
+        batch_op.create_index('ix_person_reference_number', ['reference_number'], unique=False)
@@ -0,0 +1,58 @@
+"""raffle slug
+
+Revision ID: b6f0d3a8e215
+Revises: 5d8c1e4f9a62
+Create Date: 2026-10-18 23:12:07.584391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+import unicodedata
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f0d3a8e215'
+down_revision = '5d8c1e4f9a62'
+branch_labels = None
+depends_on = None
+
+
+def slugify(name):
+    # Copia de app.models.slugify al momento de esta migración
+    ascii_name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '-', ascii_name.lower()).strip('-')[:100] or 'sorteo'
+
+
+def upgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('slug', sa.String(length=100), nullable=True))
+
+    # Nombres distintos pueden dar el mismo slug ("Rifa 1" y "rifa-1"): se agrega el id
+    raffle = sa.table('raffle', sa.column('id', sa.Integer()), sa.column('name', sa.String()),
+                      sa.column('slug', sa.String()))
+    bind = op.get_bind()
+    updates, taken = [], set()
+    for raffle_id, name in bind.execute(sa.select(raffle.c.id, raffle.c.name).order_by(raffle.c.id)):
+        slug = slugify(name)
+        if slug in taken:
+            slug = f'{slug[:90]}-{raffle_id}'
+        taken.add(slug)
+        updates.append({'raffle_id': raffle_id, 'value': slug})
+    if updates:
+        bind.execute(
+            raffle.update().where(raffle.c.id == sa.bindparam('raffle_id')).values(slug=sa.bindparam('value')),
+            updates,
+        )
+
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.alter_column('slug', existing_type=sa.String(length=100), nullable=False)
+        batch_op.create_unique_constraint('uq_raffle_slug', ['slug'])
+        batch_op.create_index('ix_raffle_active_slug', ['active', 'slug'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.drop_index('ix_raffle_active_slug')
+        batch_op.drop_constraint('uq_raffle_slug', type_='unique')
+        batch_op.drop_column('slug')
@@ -0,0 +1,26 @@
+"""raffle image hash
+
+Revision ID: c52d9e1f7a3b
+Revises: 8a4e6d2c1b57
+Create Date: 2026-10-18 16:41:03.718245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d9e1f7a3b'
+down_revision = '8a4e6d2c1b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_hash', sa.String(length=16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('raffle', schema=None) as batch_op:
+        batch_op.drop_column('image_hash')
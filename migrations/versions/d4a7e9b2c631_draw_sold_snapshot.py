@@ -0,0 +1,28 @@
+"""draw sold snapshot
+
+Revision ID: d4a7e9b2c631
+Revises: b6f0d3a8e215
+Create Date: 2026-10-19 10:02:44.903117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7e9b2c631'
+down_revision = 'b6f0d3a8e215'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('draw', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('max_number', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('sold_bitmap', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('draw', schema=None) as batch_op:
+        batch_op.drop_column('sold_bitmap')
+        batch_op.drop_column('max_number')
@@ -0,0 +1,36 @@
+"""integer raffle numbers
+
+Revision ID: e7b3a9c4d218
+Revises: c52d9e1f7a3b
+Create Date: 2026-10-18 18:12:40.503114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3a9c4d218'
+down_revision = 'c52d9e1f7a3b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los números se guardaban como texto con ceros a la izquierda ('007'); el relleno
+    # ahora se aplica solo al mostrarlos
+    with op.batch_alter_table('raffle_number', schema=None) as batch_op:
+        batch_op.alter_column('number',
+                              existing_type=sa.String(length=10),
+                              type_=sa.Integer(),
+                              existing_nullable=False,
+                              postgresql_using='number::integer')
+
+
+def downgrade():
+    with op.batch_alter_table('raffle_number', schema=None) as batch_op:
+        batch_op.alter_column('number',
+                              existing_type=sa.Integer(),
+                              type_=sa.String(length=10),
+                              existing_nullable=False,
+                              postgresql_using='number::varchar')
@@ -20,6 +20,10 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 document.addEventListener('submit', function(event) {
+    // Las descargas no cambian de página, así que la capa de carga nunca se ocultaría
+    if (event.target.hasAttribute('data-download')) {
+        return;
+    }
     var overlay = document.getElementById('overlay');
     overlay.style.display = 'flex';
     overlay.style.opacity = '1';
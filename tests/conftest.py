@@ -0,0 +1,70 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app, db
+
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        SECRET_KEY = 'test'
+        TESTING = True
+        LOGIN_DISABLED = True
+        WTF_CSRF_ENABLED = False
+        RATELIMIT_ENABLED = False
+        RATE_PROVIDER = 'static'
+        SQL_STATS_HEADERS = True
+        METRICS_DIR = str(tmp_path / 'metrics')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    """Crea un sorteo con ``persons`` compradores de ``per_person`` números cada uno."""
+    from app import db
+    from app.allocation import rebuild_pool
+    from app.models import Person, Raffle, RaffleNumber
+
+    created = []
+
+    def seed(persons, per_person=3, max_number=10000):
+        with app.app_context():
+            raffle = Raffle(name=f'prueba-{len(created)}', start_date=datetime.date.today(),
+                            max_number=max_number, valor_numero=1)
+            db.session.add(raffle)
+            db.session.flush()
+            offset = db.session.query(RaffleNumber).count()
+            for i in range(persons):
+                person = Person(first_name='Ana', last_name=f'Prueba {i}', address='-',
+                                reference_number=f'ref-{raffle.id}-{i}', email=f'ana{raffle.id}-{i}@example.com')
+                db.session.add(person)
+                db.session.flush()
+                for j in range(per_person):
+                    db.session.add(RaffleNumber(number=offset + i * per_person + j + 1,
+                                                person_id=person.id, raffle_id=raffle.id))
+            rebuild_pool(raffle)
+            db.session.commit()
+            created.append(raffle.id)
+            return raffle.id
+
+    return seed
@@ -0,0 +1,135 @@
+"""Invariantes del pool de números libres (app.allocation).
+
+Después de cualquier operación el pool de un sorteo debe contener exactamente
+los números no vendidos, sin repetidos, y ``available_count`` debe ser su
+tamaño real.
+"""
+import re
+import threading
+
+import pytest
+from sqlalchemy import event, func, select
+
+MAX_NUMBER = 60
+
+
+@pytest.fixture
+def raffle_id(seed):
+    return seed(0, max_number=MAX_NUMBER)
+
+
+def buy(app, raffle_id, count, name='Ana'):
+    from app.purchases import purchase_numbers
+    with app.app_context():
+        _, numbers = purchase_numbers(raffle_id, count, first_name=name, last_name='Prueba', address='-',
+                                      reference_number=f'ref-{name}', email=f'{name.lower()}@example.com')
+        return numbers
+
+
+def assert_pool_consistent(app, raffle_id):
+    from app import db
+    from app.allocation import _load_slots
+    from app.models import NumberPoolSlot, Raffle, RaffleNumber
+
+    with app.app_context():
+        raffle = db.session.get(Raffle, raffle_id)
+        free = list(_load_slots(raffle.id, range(raffle.available_count)).values())
+        sold = list(db.session.scalars(select(RaffleNumber.number).where(RaffleNumber.raffle_id == raffle_id)))
+        stale = db.session.scalar(select(func.count()).where(NumberPoolSlot.raffle_id == raffle_id,
+                                                              NumberPoolSlot.slot >= raffle.available_count))
+
+        assert len(set(free)) == len(free), 'números repetidos en el pool'
+        assert len(set(sold)) == len(sold), 'números vendidos dos veces'
+        assert not set(free) & set(sold), 'números vendidos de vuelta en el pool'
+        # Al reducir max_number los vendidos por encima del nuevo máximo siguen vendidos
+        assert set(free) == set(range(1, raffle.max_number + 1)) - set(sold)
+        assert raffle.available_count == len(free)
+        assert stale == 0
+
+
+def number_ids(app, raffle_id):
+    from app import db
+    from app.models import RaffleNumber
+    with app.app_context():
+        return list(db.session.scalars(select(RaffleNumber.id).where(RaffleNumber.raffle_id == raffle_id)
+                                       .order_by(RaffleNumber.id)))
+
+
+def test_draw_until_sold_out(app, raffle_id):
+    from app.allocation import NotEnoughNumbers
+
+    drawn = []
+    for i, count in enumerate([1, 7, 20, 12]):
+        drawn += buy(app, raffle_id, count, name=f'Ana{i}')
+        assert_pool_consistent(app, raffle_id)
+
+    with pytest.raises(NotEnoughNumbers) as error:
+        buy(app, raffle_id, MAX_NUMBER - len(drawn) + 1, name='Otra')
+    assert error.value.available == MAX_NUMBER - len(drawn)
+
+    drawn += buy(app, raffle_id, MAX_NUMBER - len(drawn), name='Ultima')
+    assert sorted(drawn) == list(range(1, MAX_NUMBER + 1))
+    assert_pool_consistent(app, raffle_id)
+
+
+def test_release_by_deleting_numbers_and_persons(app, client, raffle_id):
+    from app import db
+    from app.models import Person
+
+    buy(app, raffle_id, 10, name='Ana')
+    buy(app, raffle_id, 10, name='Beto')
+    for number_id in number_ids(app, raffle_id)[:3]:
+        assert client.post(f'/delete_number/{number_id}').status_code == 302
+        assert_pool_consistent(app, raffle_id)
+
+    with app.app_context():
+        person_id = db.session.scalar(select(Person.id).where(Person.first_name == 'Beto'))
+    assert client.post(f'/delete_person/{person_id}').status_code == 302
+    assert_pool_consistent(app, raffle_id)
+
+    # Los números liberados se pueden volver a vender
+    buy(app, raffle_id, MAX_NUMBER - 7, name='Carla')
+    assert_pool_consistent(app, raffle_id)
+
+
+@pytest.mark.parametrize('new_max_number', [MAX_NUMBER + 25, MAX_NUMBER - 20])
+def test_resize_pool_from_edit_raffle(app, client, raffle_id, new_max_number):
+    buy(app, raffle_id, 15)
+    response = client.post(f'/edit_raffle/{raffle_id}', data={
+        'name': 'prueba', 'start_date': '2026-01-01', 'max_number': new_max_number, 'valor_numero': 1,
+    })
+    assert response.status_code == 302
+    assert_pool_consistent(app, raffle_id)
+
+
+def test_delete_number_with_concurrent_purchase(app, client, raffle_id):
+    # Otra compra se confirma justo cuando delete_number lee el sorteo. Si la lectura ocurre antes de
+    # tomar el bloqueo, el pool que se escribe después pisa esa compra
+    from app import db
+
+    buy(app, raffle_id, 10)
+    number_id = number_ids(app, raffle_id)[0]
+    request_thread = threading.current_thread()
+    purchase = threading.Thread(target=buy, args=(app, raffle_id, 5, 'Beto'))
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if purchase.ident is not None or threading.current_thread() is not request_thread:
+            return
+        if re.search(r'\bFROM raffle\s', statement):
+            purchase.start()
+            if not cursor.connection.in_transaction:
+                # Sin bloqueo tomado nada impide que la compra termine antes de seguir
+                purchase.join()
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    try:
+        assert client.post(f'/delete_number/{number_id}').status_code == 302
+    finally:
+        event.remove(engine, 'after_cursor_execute', after_cursor_execute)
+    purchase.join()
+
+    assert purchase.ident is not None
+    assert len(number_ids(app, raffle_id)) == 14
+    assert_pool_consistent(app, raffle_id)
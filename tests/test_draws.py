@@ -0,0 +1,56 @@
+"""Commit y reveal de ganadores (app.draws)."""
+import base64
+
+import pytest
+from sqlalchemy import update
+
+
+def commit(app, raffle_id, prizes=('Primero', 'Segundo')):
+    from app import db
+    from app.draws import commit_draw
+    from app.models import Raffle
+    with app.app_context():
+        raffle = db.session.get(Raffle, raffle_id)
+        raffle.active = False
+        db.session.commit()
+        draw = commit_draw(raffle, list(prizes), 'lotería del domingo')
+        db.session.commit()
+        return draw.id
+
+
+def reveal(app, draw_id):
+    from app import db
+    from app.draws import reveal_draw
+    from app.models import Draw
+    with app.app_context():
+        reveal_draw(db.session.get(Draw, draw_id), '12 34 56')
+        db.session.commit()
+
+
+def test_reveal_can_be_replayed_from_published_data(app, client, seed):
+    from app.draws import _sha256, pick_winners
+
+    draw_id = commit(app, seed(10))
+    reveal(app, draw_id)
+
+    result = client.get(f'/api/draws/{draw_id}').get_json()
+    bitmap = base64.b64decode(result['sold_bitmap'])
+    assert _sha256(bitmap) == result['sold_digest']
+    seed_value = _sha256(f'{result["seed"]}|{result["entropy"]}|{result["sold_digest"]}')
+    assert pick_winners(seed_value, bytearray(bitmap), result['prizes']) == [w['number'] for w in result['winners']]
+
+
+def test_reveal_refuses_commit_without_sold_snapshot(app, seed):
+    from app import db
+    from app.draws import DrawError
+    from app.models import Draw
+
+    draw_id = commit(app, seed(10))
+    with app.app_context():
+        db.session.execute(update(Draw.__table__).where(Draw.id == draw_id).values(sold_bitmap=None))
+        db.session.commit()
+
+    with pytest.raises(DrawError):
+        reveal(app, draw_id)
+    with app.app_context():
+        assert db.session.get(Draw, draw_id).revealed_at is None
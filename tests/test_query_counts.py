@@ -0,0 +1,68 @@
+"""Las vistas de administración hacen las mismas consultas con 5 o con 60 filas.
+
+El número sale de la cabecera ``X-SQL-Count`` (``SQL_STATS_HEADERS``); si sube
+con los datos, alguna relación se está cargando fila por fila (N+1).
+"""
+import pytest
+
+from app.queries import encode_cursor
+
+# Las páginas por cursor no cuentan los totales
+CURSOR = encode_cursor([0, 0])
+
+ENDPOINTS = [
+    ('/list_numbers', 0),
+    ('/list_person', 0),
+    ('/list_raffles', 1),
+    ('/api/numbers', 2),
+    ('/api/numbers?search=ana', 3),
+    ('/api/numbers?raffle_id={raffle_id}', 2),
+    ('/api/numbers?order=last_name&dir=desc&length=100', 2),
+    (f'/api/numbers?cursor={CURSOR}', 1),
+    (f'/api/numbers?search=ana&cursor={CURSOR}', 1),
+    ('/api/persons', 3),
+    ('/api/persons?search=ana', 4),
+    ('/api/persons?raffle_id={raffle_id}', 3),
+    (f'/api/persons?cursor={CURSOR}', 2),
+]
+
+
+def sql_count(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return int(response.headers['X-SQL-Count'])
+
+
+@pytest.mark.parametrize('url, budget', ENDPOINTS)
+def test_query_count_does_not_grow_with_rows(client, seed, url, budget):
+    raffle_id = seed(5)
+    small = sql_count(client, url.format(raffle_id=raffle_id))
+
+    seed(60)
+    large = sql_count(client, url.format(raffle_id=raffle_id))
+
+    assert small == large
+    assert large <= budget
+
+
+def test_delete_person_releases_numbers_in_every_raffle(app, client, seed):
+    from app import db
+    from app.allocation import rebuild_pool
+    from app.models import Person, Raffle, RaffleNumber
+
+    first, second = seed(1), seed(0)
+    with app.app_context():
+        person = db.session.scalar(db.select(Person))
+        db.session.add(RaffleNumber(number=500, person_id=person.id, raffle_id=second))
+        db.session.flush()
+        rebuild_pool(db.session.get(Raffle, second))
+        db.session.commit()
+        person_id = person.id
+
+    assert client.post(f'/delete_person/{person_id}').status_code == 302
+
+    with app.app_context():
+        assert db.session.get(Person, person_id) is None
+        assert db.session.query(RaffleNumber).count() == 0
+        assert db.session.get(Raffle, first).available_count == 10000
+        assert db.session.get(Raffle, second).available_count == 10000
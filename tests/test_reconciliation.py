@@ -0,0 +1,35 @@
+"""Un pago solo queda conciliado si el monto del estado de cuenta coincide."""
+import pytest
+
+
+def statuses(app, raffle_id, text):
+    from app import db
+    from app.models import Raffle
+    from app.reconciliation import parse_statement, reconcile
+    with app.app_context():
+        matches = reconcile(db.session.get(Raffle, raffle_id), parse_statement(text))
+        return {match.reference: match.status for match in matches}
+
+
+def test_statement_without_amount_column_is_rejected():
+    from app.reconciliation import InvalidStatement, parse_statement
+    with pytest.raises(InvalidStatement):
+        parse_statement('Fecha,Referencia\n2026-01-01,ref-1-0\n')
+
+
+def test_amount_is_checked(app, seed):
+    # seed: 3 números por persona a valor 1, se esperan 3 por comprador
+    raffle_id = seed(4)
+    text = (f'Referencia;Monto\n'
+            f'ref-{raffle_id}-0;3,00\n'
+            f'ref-{raffle_id}-1;5,00\n'
+            f'ref-{raffle_id}-2;abc\n'
+            f'ref-{raffle_id}-3;\n'
+            f'otra;3\n')
+    assert statuses(app, raffle_id, text) == {
+        f'ref-{raffle_id}-0': 'matched',
+        f'ref-{raffle_id}-1': 'amount_mismatch',
+        f'ref-{raffle_id}-2': 'amount_missing',
+        f'ref-{raffle_id}-3': 'amount_missing',
+        'otra': 'unmatched',
+    }
@@ -0,0 +1,68 @@
+"""Búsqueda de las listas de administración: exacta y siempre por índice."""
+import re
+
+from sqlalchemy import event
+
+from app.queries import encode_cursor
+
+
+def search(client, kind, term, **params):
+    response = client.get(f'/api/{kind}', query_string=dict(params, search=term))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_search_by_email_reference_or_number(client, seed):
+    raffle_id = seed(5)
+    email = f'ANA{raffle_id}-2@Example.com'
+
+    numbers = search(client, 'numbers', email)
+    assert numbers['recordsFiltered'] == 3
+    assert {row['email'] for row in numbers['data']} == {email.lower()}
+
+    # La referencia se normaliza igual que al conciliar
+    persons = search(client, 'persons', f' REF {raffle_id}-3 ')
+    assert [row['reference_number'] for row in persons['data']] == [f'ref-{raffle_id}-3']
+
+    assert [row['number'] for row in search(client, 'numbers', '7')['data']] == ['00007']
+    assert search(client, 'persons', 'ana')['recordsFiltered'] == 0
+
+
+def test_cursor_pages_do_not_count(client, seed):
+    seed(5)
+    page = client.get('/api/numbers', query_string={'length': 4}).get_json()
+    assert page['recordsTotal'] == 15
+
+    following = client.get('/api/numbers', query_string={'length': 4, 'cursor': page['next_cursor']}).get_json()
+    assert following['recordsTotal'] is None
+    assert following['data'][0]['id'] == page['data'][-1]['id'] + 1
+
+
+def test_search_does_not_scan_tables(app, client, seed):
+    from app import db
+
+    raffle_id = seed(20)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for kind in ('numbers', 'persons'):
+            for params in ({}, {'raffle_id': raffle_id}, {'cursor': encode_cursor([0, 0])}):
+                search(client, kind, f'ref-{raffle_id}-4', **params)
+                search(client, kind, '12', **params)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            # recordsTotal cuenta la tabla completa a propósito, solo en la primera página
+            if re.match(r'SELECT count\((raffle_number|person)\.id\)', statement):
+                continue
+            plan = ' | '.join(row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement,
+                                                                            parameters))
+            assert not re.search(r'\bSCAN (raffle_number|person)\b', plan), f'{statement}\n{plan}'
@@ -0,0 +1,21 @@
+"""Punto de entrada WSGI.
+
+    gunicorn --preload wsgi:app
+
+Con ``--preload`` la aplicación se crea una sola vez en el maestro y los
+workers la heredan al bifurcarse: el código y las plantillas cargadas quedan
+en páginas compartidas (copy-on-write) en vez de repetirse en cada worker.
+``create_app`` no abre conexiones ni hilos que no sobrevivan al fork, y las
+dependencias que un worker web casi nunca usa (alembic, requests, Pillow) se
+importan recién cuando hacen falta.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import create_app  # noqa: E402  (la configuración lee el entorno al importarse)
+
+app = create_app()
+
+if __name__ == '__main__':
+    app.run(debug=True)